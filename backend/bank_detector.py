@@ -1,9 +1,71 @@
 """Bank file format detector"""
-from typing import Optional, Tuple
-import chardet
+from typing import Optional, Tuple, List, Callable
+import text_encoding
 from io import BytesIO
 import re
 
+# Filas del inicio de la hoja que se examinan para reconocer el banco
+DETECTION_SAMPLE_ROWS = 20
+
+# Bytes del inicio del archivo que se examinan en los formatos de texto (CSV)
+SNIFF_BYTES = 16 * 1024
+
+# Bytes del inicio del archivo donde se buscan las marcas de HTML y de Openbank
+HTML_SNIFF_BYTES = 1000
+HEAD_SNIFF_BYTES = 5000
+
+# Confianza que aporta cada tipo de rasgo: marca, título o encabezados exclusivos
+# del banco; títulos o encabezados genéricos; pistas parciales de los encabezados;
+# solo el formato del archivo y solo el nombre
+CONFIDENCE_SIGNATURE = 0.95
+CONFIDENCE_TITLE = 0.9
+CONFIDENCE_HEADER = 0.6
+CONFIDENCE_HEADER_WEAK = 0.5
+CONFIDENCE_FORMAT = 0.3
+CONFIDENCE_FILENAME = 0.2
+
+
+class DetectionSample:
+    """
+    Rasgos de un archivo calculados una sola vez y compartidos por todas las
+    firmas: marcas de bytes del inicio, texto de las primeras filas de la hoja
+    (Excel), primeras líneas (texto) y palabras del nombre del archivo
+    """
+
+    def __init__(self, file_content: bytes, filename: str = "", sheet: Optional[List[list]] = None):
+        self.head = file_content[:HEAD_SNIFF_BYTES].lower()
+        self.is_html = BankDetector.is_html_file(file_content)
+        self.is_excel = BankDetector.is_binary_xls(file_content) or BankDetector.is_xlsx(file_content)
+        self.sheet_text = BankDetector.sheet_sample(sheet) if sheet else ''
+        self.lines = [] if self.is_excel else BankDetector.text_lines(file_content)
+        # Palabras completas: 'ing' no debe coincidir dentro de 'ingresos' o 'banking'
+        self.filename_words = set(re.findall(r'[^\W\d_]+', (filename or '').lower()))
+
+    def head_has(self, *patterns: bytes) -> bool:
+        return any(pattern in self.head for pattern in patterns)
+
+    def sheet_has(self, *patterns: str) -> bool:
+        return any(pattern in self.sheet_text for pattern in patterns)
+
+    def filename_has(self, *words: str) -> bool:
+        return any(word in self.filename_words for word in words)
+
+
+class BankSignature:
+    """
+    Firma de un banco: rasgos baratos (predicados sobre la muestra compartida)
+    con la confianza que aporta cada uno. La puntuación es la del rasgo más
+    fuerte que se cumple.
+    """
+
+    def __init__(self, bank_type: str, label: str, features: List[Tuple[float, Callable[[DetectionSample], bool]]]):
+        self.bank_type = bank_type
+        self.label = label
+        self.features = features
+
+    def score(self, sample: DetectionSample) -> float:
+        return max((weight for weight, matches in self.features if matches(sample)), default=0.0)
+
 
 class BankDetector:
     """Detecta automáticamente el tipo de banco basándose en el contenido del archivo"""
@@ -11,15 +73,14 @@ class BankDetector:
     @staticmethod
     def detect_encoding(file_content: bytes) -> str:
         """Detectar la codificación del archivo"""
-        result = chardet.detect(file_content)
-        return result['encoding'] or 'utf-8'
+        return text_encoding.detect_encoding(file_content)
     
     @staticmethod
     def is_html_file(file_content: bytes) -> bool:
         """Verificar si el archivo es HTML (Openbank usa HTML con extensión .xls)"""
         try:
             # Buscar los primeros 1000 bytes
-            sample = file_content[:1000].lower()
+            sample = file_content[:HTML_SNIFF_BYTES].lower()
             return b'<!doctype html' in sample or b'<html' in sample
         except:
             return False
@@ -37,178 +98,106 @@ class BankDetector:
         return file_content[:2] == b'PK'
     
     @staticmethod
-    def detect_openbank(file_content: bytes) -> bool:
-        """Detectar si el archivo es de Openbank"""
-        try:
-            # Openbank usa HTML con extensión .xls
-            if BankDetector.is_html_file(file_content):
-                content_sample = file_content[:5000].lower()
-                # Buscar patrones específicos de Openbank
-                return (b'openbank' in content_sample or 
-                        b'open bank' in content_sample or
-                        b'cuenta corriente open' in content_sample or
-                        (b'fecha operaci' in content_sample and 
-                         b'fecha valor' in content_sample and
-                         b'concepto' in content_sample))
-            return False
-        except:
-            return False
+    def load_sheet(file_content: bytes) -> Optional[List[list]]:
+        """Leer una sola vez las celdas de la hoja si el archivo es Excel (None si no lo es)"""
+        if not (BankDetector.is_binary_xls(file_content) or BankDetector.is_xlsx(file_content)):
+            return None
+        from parsers import read_excel_cells
+        return read_excel_cells(file_content)
     
     @staticmethod
-    def detect_kutxabank(file_content: bytes) -> Tuple[bool, Optional[str]]:
-        """Detectar si el archivo es de Kutxabank y su tipo (cuenta o tarjeta)"""
-        try:
-            # Verificar si es XLS (binario antiguo) o XLSX (moderno)
-            is_xls = BankDetector.is_binary_xls(file_content)
-            is_xlsx_file = BankDetector.is_xlsx(file_content)
-            
-            if is_xls or is_xlsx_file:
-                # Es un archivo Excel, probablemente Kutxabank
-                # Intentar leer con pandas para ver el contenido
-                import pandas as pd
-                try:
-                    # Intentar con el engine apropiado
-                    if is_xls:
-                        df = pd.read_excel(BytesIO(file_content), engine='xlrd', header=None)
-                    else:
-                        df = pd.read_excel(BytesIO(file_content), engine='openpyxl', header=None)
-                    
-                    # Convertir todo a string para buscar patrones
-                    content_str = ' '.join([
-                        ' '.join([str(val) for val in row if pd.notna(val)])
-                        for _, row in df.iterrows()
-                    ]).lower()
-                    
-                    # Detectar si es tarjeta o cuenta basándose en palabras clave
-                    # La tarjeta tiene "movimientos de tarjetas" o "información de movimientos de tarjetas"
-                    # La cuenta tiene "movimientos de cuenta"
-                    if 'movimientos de tarjetas' in content_str or 'información de movimientos de tarjetas' in content_str:
-                        return True, 'kutxabank_card'
-                    elif 'movimientos de cuenta' in content_str:
-                        return True, 'kutxabank_account'
-                    # Si tiene "saldo" es más probable que sea cuenta (las tarjetas no suelen tener saldo)
-                    elif 'saldo' in content_str and 'importe' in content_str:
-                        return True, 'kutxabank_account'
-                    # Si solo tiene "importe de la operación" sin "saldo", probablemente es tarjeta
-                    elif 'importe de la operación' in content_str or 'importe de la operacion' in content_str:
-                        return True, 'kutxabank_card'
-                    else:
-                        # Por defecto, si no se puede determinar, asumir cuenta
-                        return True, 'kutxabank_account'
-                except Exception as e:
-                    print(f"Error reading Kutxabank file: {e}")
-                    # Si no se puede leer, asumir cuenta por defecto
-                    return True, 'kutxabank_account'
-            return False, None
-        except:
-            return False, None
+    def sniff_sheet(file_content: bytes, max_rows: int = DETECTION_SAMPLE_ROWS) -> Optional[List[list]]:
+        """
+        Leer solo las primeras filas de la hoja de un Excel (None si no es Excel)
+        sin cargar el libro completo, para que la detección no dependa del
+        tamaño del extracto: openpyxl en modo read_only y xlrd on_demand
+        """
+        if BankDetector.is_xlsx(file_content):
+            import openpyxl
+            workbook = openpyxl.load_workbook(BytesIO(file_content), read_only=True, data_only=True)
+            try:
+                worksheet = workbook.worksheets[0]
+                return [list(row) for row in worksheet.iter_rows(max_row=max_rows, values_only=True)]
+            finally:
+                workbook.close()
+        
+        if BankDetector.is_binary_xls(file_content):
+            import xlrd
+            workbook = xlrd.open_workbook(file_contents=file_content, on_demand=True)
+            try:
+                worksheet = workbook.sheet_by_index(0)
+                return [worksheet.row_values(i) for i in range(min(max_rows, worksheet.nrows))]
+            finally:
+                workbook.release_resources()
+        
+        return None
     
     @staticmethod
-    def detect_imaginbank(file_content: bytes) -> bool:
-        """Detectar si el archivo es de Imaginbank"""
+    def sheet_sample(sheet: List[list]) -> str:
+        """Texto en minúsculas de las primeras filas de la hoja, donde están títulos y encabezados"""
+        return ' '.join([
+            ' '.join([str(val) for val in row if val is not None and val != ''])
+            for row in sheet[:DETECTION_SAMPLE_ROWS]
+        ]).lower()
+    
+    
+    @staticmethod
+    def text_lines(file_content: bytes, max_lines: int = 5) -> List[str]:
+        """Primeras líneas de un archivo de texto (CSV), decodificando solo el inicio"""
         try:
+            # La codificación se detecta sobre el archivo completo: queda en caché para el parser
             encoding = BankDetector.detect_encoding(file_content)
-            # Imaginbank es CSV, intentar decodificar
-            content = file_content.decode(encoding, errors='ignore')
-            
-            # Buscar patrones típicos de Imaginbank
-            # Los archivos incluyen "EUR" en los importes
-            lines = content.split('\n')[:5]  # Primeras 5 líneas
-            
-            # Verificar si hay EUR en los valores
-            has_eur = any('EUR' in line for line in lines)
-            
-            # Verificar estructura: Concepto;Fecha;Importe;Saldo
-            if lines and ';' in lines[0]:
-                headers = lines[0].lower().split(';')
-                # Imaginbank usa: Concepto, Fecha, Importe, Saldo
-                if (any('concepto' in h for h in headers) and
-                    any('fecha' in h for h in headers) and
-                    any('importe' in h for h in headers) and
-                    has_eur):
-                    return True
-            
-            return False
-        except:
-            return False
+            return file_content[:SNIFF_BYTES].decode(encoding, errors='ignore').split('\n')[:max_lines]
+        except Exception:
+            return []
     
     @staticmethod
-    def detect_bbva(file_content: bytes) -> bool:
-        """Detectar si el archivo es de BBVA"""
+    def read_sample(
+        file_content: bytes,
+        filename: str = "",
+        sniff: bool = False
+    ) -> Tuple[DetectionSample, Optional[List[list]]]:
+        """
+        Leer una sola vez lo necesario para evaluar todas las firmas.
+        
+        Con sniff=True solo se leen las primeras filas de los Excel; si no, se
+        lee la hoja completa y se devuelve para que el parser la reutilice.
+        """
+        sheet = None
         try:
-            # BBVA usa archivos Excel (.xlsx principalmente)
-            is_xls = BankDetector.is_binary_xls(file_content)
-            is_xlsx_file = BankDetector.is_xlsx(file_content)
-            
-            if is_xls or is_xlsx_file:
-                import pandas as pd
-                try:
-                    # Leer el archivo
-                    if is_xlsx_file:
-                        df = pd.read_excel(BytesIO(file_content), engine='openpyxl', header=None)
-                    else:
-                        df = pd.read_excel(BytesIO(file_content), engine='xlrd', header=None)
-                    
-                    # Convertir a string para buscar patrones
-                    content_str = ' '.join([
-                        ' '.join([str(val) for val in row if pd.notna(val)])
-                        for _, row in df.iterrows()
-                    ]).lower()
-                    
-                    # Patrones específicos de BBVA:
-                    # - Tienen "Últimos movimientos" en el encabezado
-                    # - Columnas: F.Valor, Fecha, Concepto, Movimiento, Importe, Divisa, Disponible
-                    if ('últimos movimientos' in content_str or 'ultimos movimientos' in content_str or
-                        ('f.valor' in content_str and 'disponible' in content_str) or
-                        ('bbva' in content_str)):
-                        return True
-                    
-                    return False
-                except:
-                    return False
-            return False
-        except:
-            return False
+            if sniff:
+                sheet = BankDetector.sniff_sheet(file_content)
+            else:
+                sheet = BankDetector.load_sheet(file_content)
+        except Exception as e:
+            # Sin muestra de la hoja solo queda el formato (Kutxabank cuenta por defecto)
+            print(f"Error reading Excel file: {e}")
+        return DetectionSample(file_content, filename, sheet), sheet
     
     @staticmethod
-    def detect_ing(file_content: bytes) -> bool:
-        """Detectar si el archivo es de ING Direct"""
-        try:
-            # ING usa archivos Excel (.xls principalmente)
-            is_xls = BankDetector.is_binary_xls(file_content)
-            is_xlsx_file = BankDetector.is_xlsx(file_content)
-            
-            if is_xls or is_xlsx_file:
-                import pandas as pd
-                try:
-                    # Leer el archivo
-                    if is_xls:
-                        df = pd.read_excel(BytesIO(file_content), engine='xlrd', header=None)
-                    else:
-                        df = pd.read_excel(BytesIO(file_content), engine='openpyxl', header=None)
-                    
-                    # Convertir a string para buscar patrones
-                    content_str = ' '.join([
-                        ' '.join([str(val) for val in row if pd.notna(val)])
-                        for _, row in df.iterrows()
-                    ]).lower()
-                    
-                    # Patrones específicos de ING:
-                    # - "Movimientos de la Cuenta" en el título
-                    # - Columnas: F. VALOR, CATEGORÍA, SUBCATEGORÍA, DESCRIPCIÓN, IMPORTE (€), SALDO (€)
-                    # - "Ventajas ING" como categoría típica
-                    if ('movimientos de la cuenta' in content_str or
-                        'ventajas ing' in content_str or
-                        ('f. valor' in content_str and 'categoría' in content_str and 'subcategoría' in content_str) or
-                        ('f. valor' in content_str and 'categoria' in content_str and 'subcategoria' in content_str)):
-                        return True
-                    
-                    return False
-                except:
-                    return False
-            return False
-        except:
-            return False
+    def score(sample: DetectionSample) -> Tuple[Optional[str], float]:
+        """
+        Puntuar todas las firmas registradas sobre la misma muestra y devolver
+        la mejor (con empate, la registrada antes) y su confianza
+        """
+        best_type, best_score = None, 0.0
+        for signature in BANK_SIGNATURES:
+            signature_score = signature.score(sample)
+            if signature_score > best_score:
+                best_type, best_score = signature.bank_type, signature_score
+        return best_type, best_score
+    
+    @staticmethod
+    def detect_with_confidence(file_content: bytes, filename: str = "") -> Tuple[Optional[str], float]:
+        """
+        Detectar el banco a partir del inicio del archivo (tiempo constante sea
+        cual sea el tamaño del extracto).
+        
+        Returns:
+            Tuple: (tipo de banco o None, confianza entre 0 y 1)
+        """
+        sample, _ = BankDetector.read_sample(file_content, filename, sniff=True)
+        return BankDetector.score(sample)
     
     @staticmethod
     def detect_bank_type(file_content: bytes, filename: str = "") -> Optional[str]:
@@ -219,54 +208,99 @@ class BankDetector:
             str: El tipo de banco ('openbank', 'kutxabank_account', 'kutxabank_card', 'imaginbank', 'bbva', 'ing')
             None: Si no se puede detectar
         """
-        # 1. Verificar Openbank (HTML disfrazado como XLS)
-        if BankDetector.detect_openbank(file_content):
-            return 'openbank'
-        
-        # 2. Verificar BBVA (Excel con "Últimos movimientos")
-        if BankDetector.detect_bbva(file_content):
-            return 'bbva'
-        
-        # 3. Verificar ING Direct (Excel con "Movimientos de la Cuenta")
-        if BankDetector.detect_ing(file_content):
-            return 'ing'
-        
-        # 4. Verificar Kutxabank (XLS binario)
-        is_kutxa, kutxa_type = BankDetector.detect_kutxabank(file_content)
-        if is_kutxa:
-            return kutxa_type
-        
-        # 5. Verificar Imaginbank (CSV con EUR)
-        if BankDetector.detect_imaginbank(file_content):
-            return 'imaginbank'
-        
-        # 6. Si no se detecta, intentar por extensión del archivo
-        if filename:
-            filename_lower = filename.lower()
-            if 'bbva' in filename_lower:
-                return 'bbva'
-            elif 'ing' in filename_lower:
-                return 'ing'
-            elif 'openbank' in filename_lower:
-                return 'openbank'
-            elif 'kutxabank' in filename_lower or 'kutxa' in filename_lower:
-                if 'tarjeta' in filename_lower or 'card' in filename_lower:
-                    return 'kutxabank_card'
-                else:
-                    return 'kutxabank_account'
-            elif 'imaginbank' in filename_lower or 'imagin' in filename_lower:
-                return 'imaginbank'
+        return BankDetector.detect_with_confidence(file_content, filename)[0]
+    
+    @staticmethod
+    def detect(file_content: bytes, filename: str = "") -> Tuple[Optional[str], Optional[List[list]]]:
+        """
+        Detectar el tipo de banco leyendo el archivo una sola vez y devolver
+        también la hoja completa de los Excel para que el parser la reutilice.
         
-        return None
+        Returns:
+            Tuple: (tipo de banco o None, celdas de la hoja si el archivo es Excel)
+        """
+        sample, sheet = BankDetector.read_sample(file_content, filename)
+        return BankDetector.score(sample)[0], sheet
+    
+    @staticmethod
+    def get_bank_name(bank_type: str) -> str:
+        """Nombre visible de un tipo de banco"""
+        for signature in BANK_SIGNATURES:
+            if signature.bank_type == bank_type:
+                return signature.label
+        return bank_type
+    
+    @staticmethod
+    def is_supported(bank_type: str) -> bool:
+        """Si el tipo de banco es uno de los soportados"""
+        return any(signature.bank_type == bank_type for signature in BANK_SIGNATURES)
     
     @staticmethod
     def get_available_banks() -> list:
         """Retorna la lista de bancos soportados"""
         return [
-            {'value': 'kutxabank_account', 'label': 'Kutxabank - Cuenta Corriente'},
-            {'value': 'kutxabank_card', 'label': 'Kutxabank - Tarjeta de Crédito'},
-            {'value': 'openbank', 'label': 'Openbank'},
-            {'value': 'imaginbank', 'label': 'Imaginbank'},
-            {'value': 'bbva', 'label': 'BBVA'},
-            {'value': 'ing', 'label': 'ING Direct'}
+            {'value': signature.bank_type, 'label': signature.label}
+            for signature in BANK_SIGNATURES
         ]
+
+
+def _is_imaginbank_header(sample: DetectionSample) -> bool:
+    """CSV separado por ';' con Concepto, Fecha e Importe y EUR en los importes"""
+    lines = sample.lines
+    if not lines or ';' not in lines[0]:
+        return False
+    headers = lines[0].lower().split(';')
+    return (any('concepto' in h for h in headers) and
+            any('fecha' in h for h in headers) and
+            any('importe' in h for h in headers) and
+            any('EUR' in line for line in lines))
+
+
+# Registro de firmas. Para añadir un banco basta con registrar su firma; con
+# la misma confianza gana la registrada antes. El orden es también el de la
+# lista de bancos que se muestra al usuario.
+BANK_SIGNATURES: List[BankSignature] = [
+    BankSignature('kutxabank_account', 'Kutxabank - Cuenta Corriente', [
+        (CONFIDENCE_TITLE, lambda s: s.sheet_has('movimientos de cuenta') and not s.sheet_has('movimientos de tarjetas')),
+        # Si tiene "saldo" es más probable que sea cuenta (las tarjetas no suelen tener saldo)
+        (CONFIDENCE_HEADER, lambda s: s.sheet_has('saldo') and s.sheet_has('importe')),
+        # Por defecto, un Excel sin otra firma se trata como cuenta de Kutxabank
+        (CONFIDENCE_FORMAT, lambda s: s.is_excel),
+        (CONFIDENCE_FILENAME, lambda s: s.filename_has('kutxabank', 'kutxa') and
+                                        not s.filename_has('tarjeta', 'tarjetas', 'card')),
+    ]),
+    BankSignature('kutxabank_card', 'Kutxabank - Tarjeta de Crédito', [
+        # "Movimientos de tarjetas" o "Información de movimientos de tarjetas"
+        (CONFIDENCE_TITLE, lambda s: s.sheet_has('movimientos de tarjetas')),
+        # Solo "importe de la operación" sin "saldo"
+        (CONFIDENCE_HEADER_WEAK, lambda s: s.sheet_has('importe de la operación', 'importe de la operacion')),
+        (CONFIDENCE_FILENAME, lambda s: s.filename_has('kutxabank', 'kutxa') and
+                                        s.filename_has('tarjeta', 'tarjetas', 'card')),
+    ]),
+    BankSignature('openbank', 'Openbank', [
+        # Openbank usa HTML con extensión .xls
+        (CONFIDENCE_SIGNATURE, lambda s: s.is_html and (
+            s.head_has(b'openbank', b'open bank', b'cuenta corriente open') or
+            (s.head_has(b'fecha operaci') and s.head_has(b'fecha valor') and s.head_has(b'concepto')))),
+        (CONFIDENCE_FILENAME, lambda s: s.filename_has('openbank')),
+    ]),
+    BankSignature('imaginbank', 'Imaginbank', [
+        (CONFIDENCE_TITLE, _is_imaginbank_header),
+        (CONFIDENCE_FILENAME, lambda s: s.filename_has('imaginbank', 'imagin')),
+    ]),
+    BankSignature('bbva', 'BBVA', [
+        # "Últimos movimientos" en el encabezado o columnas F.Valor, ..., Disponible
+        (CONFIDENCE_SIGNATURE, lambda s: s.sheet_has('últimos movimientos', 'ultimos movimientos', 'bbva')),
+        (CONFIDENCE_SIGNATURE, lambda s: s.sheet_has('f.valor') and s.sheet_has('disponible')),
+        (CONFIDENCE_FILENAME, lambda s: s.filename_has('bbva')),
+    ]),
+    BankSignature('ing', 'ING Direct', [
+        # "Movimientos de la Cuenta" en el título o "Ventajas ING" como categoría típica
+        (CONFIDENCE_SIGNATURE, lambda s: s.sheet_has('movimientos de la cuenta', 'ventajas ing')),
+        # Columnas: F. VALOR, CATEGORÍA, SUBCATEGORÍA, DESCRIPCIÓN, IMPORTE (€), SALDO (€)
+        (CONFIDENCE_SIGNATURE, lambda s: s.sheet_has('f. valor') and (
+            (s.sheet_has('categoría') and s.sheet_has('subcategoría')) or
+            (s.sheet_has('categoria') and s.sheet_has('subcategoria')))),
+        (CONFIDENCE_FILENAME, lambda s: s.filename_has('ing')),
+    ]),
+]
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Comparar los lectores de Excel de los parsers (python-calamine frente a
+pandas con xlrd/openpyxl) sobre los extractos de ejemplo.
+
+Uso: python benchmark_excel.py [archivos...] [--repeat N]
+Sin archivos, se usan los Excel de ../examples.
+"""
+import argparse
+import glob
+import os
+import time
+from parsers import read_excel_cells, CalamineWorkbook
+from bank_detector import BankDetector
+
+EXAMPLES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'examples')
+
+
+def best_time(file_content: bytes, engine: str, repeat: int) -> float:
+    """Mejor tiempo (en ms) de leer las celdas con el engine indicado"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        read_excel_cells(file_content, engine)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('files', nargs='*')
+    arg_parser.add_argument('--repeat', type=int, default=20)
+    args = arg_parser.parse_args()
+
+    if CalamineWorkbook is None:
+        print("⚠️  python-calamine no está instalado (pip install python-calamine): solo se mide pandas")
+
+    files = args.files or sorted(glob.glob(os.path.join(EXAMPLES_DIR, '*.xls*')))
+
+    print(f"{'Archivo':<32} {'Filas':>6} {'pandas (ms)':>12} {'calamine (ms)':>14} {'Mejora':>7}")
+    print("-" * 76)
+    for path in files:
+        with open(path, 'rb') as f:
+            content = f.read()
+
+        name = os.path.basename(path)
+        if not (BankDetector.is_binary_xls(content) or BankDetector.is_xlsx(content)):
+            print(f"{name:<32} no es un Excel (se parsea como HTML/CSV)")
+            continue
+
+        cells = read_excel_cells(content, 'pandas')
+        pandas_ms = best_time(content, 'pandas', args.repeat)
+
+        if CalamineWorkbook is None:
+            print(f"{name:<32} {len(cells):>6} {pandas_ms:>12.2f} {'-':>14} {'-':>7}")
+            continue
+
+        # Ambos lectores deben devolver exactamente las mismas celdas
+        same = read_excel_cells(content, 'calamine') == cells
+        calamine_ms = best_time(content, 'calamine', args.repeat)
+        speedup = pandas_ms / calamine_ms if calamine_ms else 0
+        mark = '' if same else '  ❌ celdas distintas'
+        print(f"{name:<32} {len(cells):>6} {pandas_ms:>12.2f} {calamine_ms:>14.2f} {speedup:>6.1f}x{mark}")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,5 @@
 import os
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -16,12 +16,32 @@ if not DATABASE_URL:
 
 # Configurar engine según el tipo de base de datos
 if DATABASE_URL.startswith("sqlite"):
+    # Memoria máxima de la caché de páginas de cada conexión (MB)
+    SQLITE_CACHE_MB = int(os.getenv("SQLITE_CACHE_MB", "64"))
+
     # SQLite necesita check_same_thread=False para FastAPI
+    # timeout: segundos que una escritura espera a que otra libere el bloqueo
+    # de la base de datos antes de fallar con "database is locked"
     engine = create_engine(
         DATABASE_URL, 
-        connect_args={"check_same_thread": False}
+        connect_args={
+            "check_same_thread": False,
+            "timeout": float(os.getenv("SQLITE_BUSY_TIMEOUT", "30")),
+        }
     )
     print(f"📁 Using SQLite database: {DATABASE_URL}")
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_wal(dbapi_connection, connection_record):
+        # WAL: las lecturas (p. ej. el progreso de una importación) no esperan
+        # a que termine la transacción que inserta un archivo
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        # Caché de páginas por conexión (en KiB si es negativo): con la de por
+        # defecto (2 MB) insertar un archivo grande actualizando los índices
+        # tarda el doble, y ese tiempo bloquea a los demás escritores
+        cursor.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_MB * 1024}")
+        cursor.close()
 else:
     # PostgreSQL, MySQL u otras bases de datos
     engine = create_engine(
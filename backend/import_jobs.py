@@ -0,0 +1,340 @@
+"""Trabajos de importación de extractos ejecutados en segundo plano"""
+import asyncio
+from datetime import datetime
+import os
+from typing import List, Optional, Tuple, Dict, AsyncIterator
+from sqlalchemy.orm import Session
+from starlette.concurrency import run_in_threadpool
+from database import SessionLocal, engine
+from models import ImportJob, ImportJobFile
+from schemas import ImportJob as ImportJobSchema
+from bank_detector import BankDetector
+from parse_pool import StatementStream
+from ingest import load_store_mappings, stage_batch, ImportStaging
+from parsed_transactions import TransactionBatch
+
+# Estados en los que el trabajo ya no cambiará
+FINISHED_STATUSES = ('completed', 'failed')
+
+# Cada cuánto se revisa el progreso del trabajo al emitir eventos (segundos)
+JOB_EVENTS_POLL_SECONDS = float(os.getenv("JOB_EVENTS_POLL_SECONDS", "0.5"))
+
+# Cada cuánto se envía un comentario para mantener viva la conexión sin cambios (segundos)
+JOB_EVENTS_KEEPALIVE_SECONDS = 15
+
+# Contadores (filas leídas, nuevas, duplicadas) de los archivos que se están
+# insertando, por id de ImportJobFile. Se guardan en memoria para no escribir
+# en la base de datos por cada lote; las nuevas y duplicadas se conocen al
+# insertar el archivo completo, y entonces se guardan en la base de datos
+_file_progress: Dict[int, Tuple[int, int, int]] = {}
+
+def create_import_job(db: Session, user_id: int, filenames: List[str], bank_type: Optional[str]) -> ImportJob:
+    """Registrar un trabajo de importación pendiente con un registro por archivo"""
+    job = ImportJob(
+        user_id=user_id,
+        status='pending',
+        bank_type=bank_type,
+        total_files=len(filenames),
+        files=[ImportJobFile(filename=filename, status='pending') for filename in filenames]
+    )
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+async def run_import_job(job_id: int, files: List[Tuple[str, bytes]]):
+    """
+    Procesar un trabajo: cada archivo (en el orden en que se subieron) se
+    detecta y parsea en el pool de procesos y se inserta lote a lote, según
+    se van parseando sus transacciones.
+
+    El parseo de cada archivo se lanza justo antes de insertarlo: así cada
+    trabajo ocupa como mucho un proceso del pool, que no se queda bloqueado
+    con la cola llena esperando a que se inserten los archivos anteriores.
+
+    Las consultas y commits se hacen en el pool de hilos; la sesión no expira
+    los objetos al confirmar para que leer el trabajo en el event loop no
+    vuelva a consultar la base de datos (solo este trabajo lo modifica).
+    """
+    db = SessionLocal(expire_on_commit=False)
+    stream = None
+    try:
+        job, store_mappings = await run_in_threadpool(_start_job, db, job_id)
+
+        # Validar el tipo de banco proporcionado antes de parsear
+        bank_type_error = None
+        if job.bank_type and not BankDetector.is_supported(job.bank_type):
+            bank_type_error = f"Tipo de banco no soportado: {job.bank_type}"
+
+        for index, job_file in enumerate(job.files):
+            if bank_type_error:
+                await run_in_threadpool(
+                    _fail_file, db, job, job_file, f"❌ {job_file.filename}: {bank_type_error}"
+                )
+            else:
+                filename, content = files[index]
+                stream = StatementStream(content, filename, job.bank_type)
+                await _import_file(db, job, job_file, stream, store_mappings)
+
+        await run_in_threadpool(_finish_job, db, job, len(files))
+
+    except Exception as e:
+        if stream is not None:
+            await stream.close()
+        print(f"Error en el trabajo de importación {job_id}: {e}")
+        await run_in_threadpool(_fail_job, db, job_id, f"Error al procesar los archivos: {str(e)}")
+    finally:
+        await run_in_threadpool(db.close)
+
+
+def _start_job(db: Session, job_id: int) -> Tuple[ImportJob, Dict[str, Tuple[int, Optional[int]]]]:
+    """Marcar el trabajo en curso y cargar los mapeos de tienda del usuario para auto-categorización"""
+    job = db.get(ImportJob, job_id)
+    store_mappings = load_store_mappings(db, job.user_id)
+    job.status = 'running'
+    for job_file in job.files:
+        job_file.status = 'parsing'
+    # Confirmar después de leer los mapeos para que la sesión no retenga una
+    # conexión del pool mientras se esperan los archivos
+    db.commit()
+    return job, store_mappings
+
+
+async def _import_file(
+    db: Session,
+    job: ImportJob,
+    job_file: ImportJobFile,
+    stream: StatementStream,
+    store_mappings: Dict[str, Tuple[int, Optional[int]]]
+):
+    """
+    Acumular las transacciones de un archivo según llegan sus lotes e
+    insertarlas todas al final en una única transacción corta: si falla a
+    medias, no queda nada insertado, y mientras se parsea no se bloquea a
+    los demás escritores de la base de datos.
+    """
+    filename = job_file.filename
+
+    try:
+        detected_bank_type = await stream.read_bank_type()
+    except Exception as e:
+        await run_in_threadpool(_fail_file, db, job, job_file, f"❌ {filename}: Error - {str(e)}")
+        return
+
+    job_file.bank_type = detected_bank_type
+
+    if not detected_bank_type:
+        await run_in_threadpool(_fail_file, db, job, job_file, f"❌ {filename}: No se pudo detectar el banco")
+        return
+
+    job_file.status = 'inserting'
+    await run_in_threadpool(db.commit)
+
+    file_rows = file_imported = file_duplicates = 0
+    staging = None
+    try:
+        staging = await run_in_threadpool(_open_staging)
+        async for batch in stream:
+            await run_in_threadpool(_stage_batch, staging, job.user_id, batch, store_mappings)
+            file_rows += len(batch)
+            _file_progress[job_file.id] = (file_rows, 0, 0)
+        file_imported, file_duplicates = await run_in_threadpool(_insert_staged, staging)
+    except Exception as e:
+        await stream.close()
+        print(f"Error al importar {filename}: {e}")
+        await run_in_threadpool(_fail_file, db, job, job_file, f"❌ {filename}: Error - {str(e)}")
+        return
+    finally:
+        _file_progress.pop(job_file.id, None)
+        if staging is not None:
+            await run_in_threadpool(_close_staging, staging)
+
+    if not file_rows:
+        job_file.status = 'skipped'
+        job_file.message = f"⚠️ {filename}: Sin transacciones"
+        await run_in_threadpool(db.commit)
+        return
+
+    bank_name = BankDetector.get_bank_name(detected_bank_type)
+    job_file.status = 'completed'
+    job_file.total_rows = file_rows
+    job_file.imported = file_imported
+    job_file.duplicates = file_duplicates
+    job_file.message = f"✓ {filename} ({bank_name}): {file_imported} nuevas, {file_duplicates} duplicadas"
+    job.total_rows += file_rows
+    job.imported += file_imported
+    job.duplicates += file_duplicates
+    job.processed_files += 1
+    await run_in_threadpool(db.commit)
+
+
+def _open_staging() -> ImportStaging:
+    """Tabla temporal de un archivo, en una conexión propia que se conserva hasta cerrarla"""
+    conn = engine.connect()
+    try:
+        staging = ImportStaging(conn)
+        conn.commit()
+        return staging
+    except Exception:
+        conn.close()
+        raise
+
+
+def _stage_batch(
+    staging: ImportStaging,
+    user_id: int,
+    batch: TransactionBatch,
+    store_mappings: Dict[str, Tuple[int, Optional[int]]]
+):
+    """Añadir un lote a la tabla temporal del archivo (cada lote en su propia transacción)"""
+    staging.add(stage_batch(batch, user_id, store_mappings))
+    staging.conn.commit()
+
+
+def _insert_staged(staging: ImportStaging) -> Tuple[int, int]:
+    """Insertar todo el archivo en transactions en una única transacción"""
+    result = staging.insert()
+    staging.conn.commit()
+    return result
+
+
+def _close_staging(staging: ImportStaging):
+    """Descartar la tabla temporal y devolver la conexión al pool"""
+    try:
+        staging.conn.rollback()
+        staging.drop()
+        staging.conn.commit()
+    finally:
+        staging.conn.close()
+
+
+def _fail_file(db: Session, job: ImportJob, job_file: ImportJobFile, message: str):
+    job_file.status = 'failed'
+    job_file.message = message
+    job.errors += 1
+    db.commit()
+
+
+def _finish_job(db: Session, job: ImportJob, total_files: int):
+    """Construir el mensaje de resumen del trabajo y darlo por terminado"""
+    file_details = [job_file.message for job_file in job.files if job_file.message]
+
+    if job.processed_files == 0:
+        job.success = False
+        job.message = "No se pudo procesar ningún archivo. " + "; ".join(file_details)
+    else:
+        job.success = True
+        summary = (
+            f"Procesados {job.processed_files} de {total_files} archivo(s): "
+            f"{job.imported} nuevas, {job.duplicates} duplicadas, {job.errors} errores"
+        )
+        if file_details:
+            summary += "\n\n" + "\n".join(file_details)
+        job.message = summary
+
+    job.status = 'completed'
+    job.finished_at = datetime.utcnow()
+    db.commit()
+
+
+def _fail_job(db: Session, job_id: int, message: str):
+    """Dar el trabajo por fallido descartando lo que no se haya confirmado"""
+    db.rollback()
+    job = db.get(ImportJob, job_id)
+    if job:
+        _fail_unfinished_files(job)
+        job.status = 'failed'
+        job.success = False
+        job.message = message
+        job.finished_at = datetime.utcnow()
+        db.commit()
+
+
+def _fail_unfinished_files(job: ImportJob):
+    """Marcar como fallidos los archivos que el trabajo ya no terminará"""
+    for job_file in job.files:
+        if job_file.status in ('pending', 'parsing', 'inserting'):
+            job_file.status = 'failed'
+
+
+def fail_stale_jobs():
+    """
+    Dar por fallidos los trabajos que quedaron pendientes o en curso al
+    detenerse el servidor: se ejecutaban en segundo plano dentro del proceso,
+    así que ya nadie los terminará y quien siga su progreso esperaría siempre.
+    """
+    db = SessionLocal()
+    try:
+        stale_jobs = db.query(ImportJob).filter(ImportJob.status.notin_(FINISHED_STATUSES)).all()
+        now = datetime.utcnow()
+        for job in stale_jobs:
+            _fail_unfinished_files(job)
+            job.status = 'failed'
+            job.success = False
+            job.message = "La importación se interrumpió al reiniciarse el servidor. Vuelve a subir los archivos."
+            job.finished_at = now
+        db.commit()
+        if stale_jobs:
+            print(f"⚠️  {len(stale_jobs)} trabajo(s) de importación interrumpido(s) marcados como fallidos")
+    finally:
+        db.close()
+
+
+def job_progress(job: ImportJob) -> ImportJobSchema:
+    """
+    Estado del trabajo con los contadores del archivo que se está
+    insertando, que aún no están en la base de datos
+    """
+    snapshot = ImportJobSchema.model_validate(job)
+    for job_file in snapshot.files:
+        if job_file.id in _file_progress:
+            rows, imported, duplicates = _file_progress[job_file.id]
+            job_file.total_rows, job_file.imported, job_file.duplicates = rows, imported, duplicates
+            snapshot.total_rows += rows
+            snapshot.imported += imported
+            snapshot.duplicates += duplicates
+    return snapshot
+
+
+def _job_snapshot(job_id: int) -> Optional[str]:
+    """Leer el estado actual del trabajo serializado en JSON"""
+    db = SessionLocal()
+    try:
+        job = db.get(ImportJob, job_id)
+        if not job:
+            return None
+        return job_progress(job).model_dump_json()
+    finally:
+        db.close()
+
+
+async def job_events(job_id: int) -> AsyncIterator[str]:
+    """
+    Generar eventos Server-Sent Events con el progreso del trabajo.
+
+    Emite un evento "progress" cada vez que cambia el estado (archivos,
+    contadores, mensajes) y un evento "done" con el resultado final.
+    """
+    last_snapshot = None
+    idle_seconds = 0.0
+
+    while True:
+        snapshot = await run_in_threadpool(_job_snapshot, job_id)
+        if snapshot is None:
+            return
+
+        if snapshot != last_snapshot:
+            last_snapshot = snapshot
+            idle_seconds = 0.0
+            status = ImportJobSchema.model_validate_json(snapshot).status
+            event = 'done' if status in FINISHED_STATUSES else 'progress'
+            yield f"event: {event}\ndata: {snapshot}\n\n"
+            if event == 'done':
+                return
+        elif idle_seconds >= JOB_EVENTS_KEEPALIVE_SECONDS:
+            idle_seconds = 0.0
+            yield ": keep-alive\n\n"
+
+        await asyncio.sleep(JOB_EVENTS_POLL_SECONDS)
+        idle_seconds += JOB_EVENTS_POLL_SECONDS
@@ -0,0 +1,261 @@
+"""Inserción masiva de transacciones importadas desde extractos bancarios"""
+import csv
+import io
+from datetime import datetime
+from itertools import repeat
+from typing import List, Dict, Tuple, Optional
+from sqlalchemy import Column, MetaData, String, Table, inspect, text
+from sqlalchemy.schema import CreateTable
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from models import Transaction as TransactionModel, StoreMapping
+from parsed_transactions import ParsedTransaction, TransactionBatch
+import search
+
+# Columnas que se escriben en cada inserción masiva
+INSERT_COLUMNS = [
+    'user_id', 'bank_type', 'date', 'description', 'amount', 'balance',
+    'reference', 'extra_info', 'category_id', 'subcategory_id',
+    'transaction_hash', 'created_at', 'updated_at'
+]
+
+# Índice único que identifica un duplicado
+CONFLICT_COLUMNS = ['user_id', 'transaction_hash']
+UNIQUE_INDEX = 'ix_transactions_user_hash'
+
+# Tabla temporal donde se acumulan las filas de un archivo antes de insertarlas
+STAGING_TABLE = 'transactions_staging'
+
+# En SQLite se define con los tipos de transactions para que SQLAlchemy guarde
+# los valores (p. ej. las fechas) en el mismo formato, y con la descripción
+# normalizada para el índice de búsqueda
+_sqlite_staging = Table(
+    STAGING_TABLE, MetaData(),
+    *[Column(name, TransactionModel.__table__.c[name].type) for name in INSERT_COLUMNS],
+    Column('search_description', String),
+    prefixes=['TEMPORARY']
+)
+
+_DESCRIPTION = INSERT_COLUMNS.index('description')
+
+
+def setup(engine: Engine):
+    """
+    Crear el índice único (user_id, transaction_hash) en las bases de datos
+    anteriores a él: sin el índice, ON CONFLICT no es válido y fallaría
+    cualquier importación
+    """
+    indexes = {index['name'] for index in inspect(engine).get_indexes(TransactionModel.__tablename__)}
+    if UNIQUE_INDEX in indexes:
+        return
+
+    print(f"🔄 Creando el índice único {UNIQUE_INDEX} (se eliminan las transacciones duplicadas)...")
+    with engine.begin() as conn:
+        deleted = create_unique_index(conn)
+    print(f"   ✓ Índice creado, {deleted} transacciones duplicadas eliminadas")
+
+
+def create_unique_index(conn: Connection) -> int:
+    """
+    Eliminar las transacciones duplicadas (conservando la más antigua de cada
+    grupo) y sustituir el índice simple del hash por el único compuesto.
+
+    Returns:
+        int: transacciones duplicadas eliminadas
+    """
+    result = conn.execute(text("""
+        DELETE FROM transactions
+        WHERE id NOT IN (
+            SELECT MIN(id) FROM transactions
+            GROUP BY user_id, transaction_hash
+        )
+    """))
+    conn.execute(text("DROP INDEX IF EXISTS ix_transactions_transaction_hash"))
+    conn.execute(text(f"""
+        CREATE UNIQUE INDEX IF NOT EXISTS {UNIQUE_INDEX}
+        ON transactions ({', '.join(CONFLICT_COLUMNS)})
+    """))
+    return result.rowcount
+
+
+def load_store_mappings(db: Session, user_id: int) -> Dict[str, Tuple[int, Optional[int]]]:
+    """
+    Cargar de una vez todos los mapeos de tienda del usuario como
+    {store_name: (category_id, subcategory_id)} para auto-categorizar sin
+    consultas por fila
+    """
+    results = db.query(
+        StoreMapping.store_name,
+        StoreMapping.category_id,
+        StoreMapping.subcategory_id
+    ).filter(StoreMapping.user_id == user_id).all()
+
+    return {row.store_name: (row.category_id, row.subcategory_id) for row in results}
+
+
+def stage_batch(
+    batch: TransactionBatch,
+    user_id: int,
+    store_mappings: Dict[str, Tuple[int, Optional[int]]]
+) -> List[tuple]:
+    """
+    Preparar un lote parseado para la inserción masiva directamente desde sus
+    columnas: una tupla por fila en el orden de INSERT_COLUMNS, con el usuario,
+    la auto-categorización por mapeo de tienda y las marcas de tiempo.
+    """
+    now = datetime.utcnow()
+    categories = []
+    subcategories = []
+
+    for description in batch.descriptions:
+        # Auto-categorización según el establecimiento (primera palabra)
+        store_name = description.split()[0] if description else ""
+        category_id, subcategory_id = store_mappings.get(store_name, (None, None))
+        categories.append(category_id)
+        subcategories.append(subcategory_id)
+
+    return list(zip(
+        repeat(user_id), repeat(batch.bank_type), batch.dates, batch.descriptions,
+        batch.amounts, batch.balances, batch.references, batch.extra_infos,
+        categories, subcategories, batch.hashes, repeat(now), repeat(now)
+    ))
+
+
+def stage_records(
+    records: List[ParsedTransaction],
+    user_id: int,
+    categories: List[Tuple[Optional[int], Optional[int]]]
+) -> List[tuple]:
+    """
+    Preparar transacciones sueltas para la inserción masiva: una tupla por
+    fila en el orden de INSERT_COLUMNS, con la (categoría, subcategoría) que
+    corresponde a cada una.
+    """
+    now = datetime.utcnow()
+    return [
+        (
+            user_id, record.bank_type, record.date, record.description,
+            record.amount, record.balance, record.reference, record.extra_info,
+            category_id, subcategory_id, record.transaction_hash, now, now
+        )
+        for record, (category_id, subcategory_id) in zip(records, categories)
+    ]
+
+
+def insert_rows(db: Session, rows: List[tuple]) -> Tuple[int, int]:
+    """
+    Insertar en bloque las filas preparadas (tuplas en el orden de
+    INSERT_COLUMNS) dentro de la transacción actual, pasando por la tabla
+    temporal de ImportStaging.
+
+    No hace commit: el llamador decide cuándo confirmar.
+
+    Returns:
+        Tuple[int, int]: (importadas, duplicadas)
+    """
+    if not rows:
+        return 0, 0
+
+    staging = ImportStaging(db.connection())
+    staging.add(rows)
+    result = staging.insert()
+    staging.drop()
+    return result
+
+
+class ImportStaging:
+    """
+    Tabla temporal con las filas de un archivo pendientes de insertar.
+
+    Las filas se acumulan lote a lote sin tocar transactions (en SQLite no
+    bloquean a los demás escritores mientras se parsea el archivo) y al final
+    se pasan todas con INSERT ... SELECT ... ON CONFLICT DO NOTHING en una
+    única transacción corta, así que el archivo se inserta entero o nada.
+
+    Los duplicados los descarta la propia base de datos con el índice único
+    (user_id, transaction_hash); se cuentan a partir de las filas afectadas.
+    En SQLite, las transacciones insertadas se añaden en la misma transacción
+    al índice de búsqueda.
+
+    Las tablas temporales son de cada conexión: todas las llamadas deben
+    usar la misma. No hace commit.
+    """
+
+    def __init__(self, conn: Connection):
+        self.conn = conn
+        self.dialect = conn.dialect.name
+        self.staged = 0
+
+        if self.dialect == 'sqlite':
+            conn.execute(CreateTable(_sqlite_staging, if_not_exists=True))
+        elif self.dialect == 'postgresql':
+            conn.exec_driver_sql(
+                f"CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} "
+                f"AS SELECT {', '.join(INSERT_COLUMNS)} FROM {TransactionModel.__tablename__} WITH NO DATA"
+            )
+        else:
+            raise ValueError(f"Base de datos no soportada para la importación: {self.dialect}")
+
+    def add(self, rows: List[tuple]):
+        """Añadir filas preparadas (tuplas en el orden de INSERT_COLUMNS)"""
+        if not rows:
+            return
+        if self.dialect == 'postgresql':
+            self._copy(rows)
+        else:
+            # Una sola sentencia compilada ejecutada con executemany; la
+            # descripción se normaliza aquí y no en SQL al indexarla
+            values = []
+            for row in rows:
+                value = dict(zip(INSERT_COLUMNS, row))
+                description = row[_DESCRIPTION]
+                value['search_description'] = search.normalize(description) if description else description
+                values.append(value)
+            self.conn.execute(_sqlite_staging.insert(), values)
+        self.staged += len(rows)
+
+    def insert(self) -> Tuple[int, int]:
+        """
+        Pasar las filas acumuladas a transactions y vaciar la tabla temporal
+
+        Returns:
+            Tuple[int, int]: (importadas, duplicadas)
+        """
+        columns = ', '.join(INSERT_COLUMNS)
+        # WHERE true: en SQLite, sin él ON CONFLICT se interpretaría como parte del SELECT
+        result = self.conn.exec_driver_sql(
+            f"INSERT INTO {TransactionModel.__tablename__} ({columns}) "
+            f"SELECT {columns} FROM {STAGING_TABLE} WHERE true "
+            f"ON CONFLICT ({', '.join(CONFLICT_COLUMNS)}) DO NOTHING"
+        )
+        imported = result.rowcount
+        if self.dialect == 'sqlite' and imported:
+            # Los ids de una misma sentencia son consecutivos y acaban en el último insertado
+            last_id = self.conn.exec_driver_sql("SELECT last_insert_rowid()").scalar()
+            search.index_staged(self.conn, STAGING_TABLE, last_id - imported + 1, last_id)
+        self.conn.exec_driver_sql(f"DELETE FROM {STAGING_TABLE}")
+
+        staged, self.staged = self.staged, 0
+        return imported, staged - imported
+
+    def drop(self):
+        """Eliminar la tabla temporal (la conexión vuelve al pool y la conservaría)"""
+        self.conn.exec_driver_sql(f"DROP TABLE IF EXISTS {STAGING_TABLE}")
+
+    def _copy(self, rows: List[tuple]):
+        """Volcar las filas a la tabla temporal con COPY FROM STDIN (PostgreSQL)"""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(['\\N' if value is None else value for value in row])
+        buffer.seek(0)
+
+        # Usar la misma conexión para compartir la transacción y la tabla temporal
+        cursor = self.conn.connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {STAGING_TABLE} ({', '.join(INSERT_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer
+            )
+        finally:
+            cursor.close()
@@ -2,10 +2,20 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from database import engine, Base
 from routes import transactions, categories, upload, reports, auth
+import parse_pool
+import import_jobs
+import ingest
+import search
 
 # Crear las tablas
 Base.metadata.create_all(bind=engine)
 
+# Crear el índice único de transacciones si la base de datos es anterior a él
+ingest.setup(engine)
+
+# Crear el índice de búsqueda por descripción
+search.setup(engine)
+
 app = FastAPI(
     title="Control de Gastos API",
     description="API para el control financiero del hogar",
@@ -19,6 +29,8 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    # El listado de transacciones pagina con esta cabecera
+    expose_headers=["X-Next-Cursor"],
 )
 
 # Incluir rutas
@@ -28,6 +40,20 @@ app.include_router(categories.router, prefix="/api/categories", tags=["categorie
 app.include_router(upload.router, prefix="/api/upload", tags=["upload"])
 app.include_router(reports.router, prefix="/api/reports", tags=["reports"])
 
+@app.on_event("startup")
+def fail_stale_import_jobs():
+    # Los trabajos que se ejecutaban al detenerse el servidor no terminarán nunca
+    import_jobs.fail_stale_jobs()
+
+@app.on_event("startup")
+def start_parse_pool():
+    # Arrancar los procesos de parseo con pandas/openpyxl/xlrd ya importados
+    parse_pool.start()
+
+@app.on_event("shutdown")
+def stop_parse_pool():
+    parse_pool.shutdown()
+
 @app.get("/")
 async def root():
     return {"message": "Control de Gastos API", "version": "1.0.0"}
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Script de migración para crear los índices compuestos de transacciones.
+
+Crea en bases de datos existentes los índices definidos en
+models.Transaction que aún no existan (por usuario y fecha, banco, categoría,
+sin categoría, importe y descripción), elimina los de una sola columna que
+estos cubren y actualiza las estadísticas para que el planificador los use.
+Se puede ejecutar varias veces.
+"""
+
+import sys
+from sqlalchemy import text
+from database import engine
+from models import Transaction
+
+# Índices de una sola columna que ya cubren los compuestos (solo encarecían las inserciones)
+REDUNDANT_INDEXES = ['ix_transactions_user_id', 'ix_transactions_date']
+
+def migrate():
+    """Ejecutar la migración"""
+    try:
+        print("🔄 Iniciando migración de base de datos...")
+
+        with engine.connect() as conn:
+            # Iniciar transacción
+            trans = conn.begin()
+
+            try:
+                # 1. Crear los índices que falten
+                print("\n📝 Creando índices de transacciones...")
+                for index in sorted(Transaction.__table__.indexes, key=lambda index: index.name):
+                    # El único (user_id, transaction_hash) lo crea migrate_unique_transaction_hash.py
+                    # tras eliminar los duplicados
+                    if index.unique:
+                        continue
+                    index.create(conn, checkfirst=True)
+                    print(f"   ✓ {index.name}")
+
+                # 2. Eliminar los índices redundantes
+                print("\n📝 Eliminando índices redundantes...")
+                for name in REDUNDANT_INDEXES:
+                    conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+                    print(f"   ✓ {name}")
+
+                trans.commit()
+
+            except Exception as e:
+                trans.rollback()
+                print(f"\n❌ Error durante la migración: {e}")
+                return False
+
+            # 3. Actualizar estadísticas (fuera de la transacción)
+            print("\n📝 Actualizando estadísticas...")
+            conn.execute(text("ANALYZE"))
+            conn.commit()
+            print("   ✓ Estadísticas actualizadas")
+
+        print("\n✅ Migración completada exitosamente!")
+        return True
+
+    except Exception as e:
+        print(f"\n❌ Error: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("  MIGRACIÓN: Índices de transacciones")
+    print("=" * 60)
+
+    success = migrate()
+
+    if success:
+        print("\n🎉 ¡Los listados e informes usarán ahora los índices!")
+        print("\nPróximos pasos:")
+        print("  1. Reinicia el backend: docker compose restart backend")
+        sys.exit(0)
+    else:
+        print("\n⚠️  La migración no se completó correctamente")
+        sys.exit(1)
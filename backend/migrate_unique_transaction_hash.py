@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Script de migración para hacer único transaction_hash por usuario.
+
+Elimina las transacciones duplicadas que se hayan acumulado (conserva la más
+antigua de cada grupo) y crea el índice único (user_id, transaction_hash)
+que usa la importación con ON CONFLICT DO NOTHING. El backend lo hace
+también al arrancar si falta el índice.
+"""
+
+import sys
+from database import engine
+from ingest import create_unique_index
+
+def migrate():
+    """Ejecutar la migración"""
+    try:
+        print("🔄 Iniciando migración de base de datos...")
+
+        with engine.connect() as conn:
+            # Iniciar transacción
+            trans = conn.begin()
+
+            try:
+                # Eliminar duplicados conservando el id más bajo y sustituir el
+                # índice simple por el índice único compuesto
+                print("\n📝 Eliminando duplicados y creando índice único (user_id, transaction_hash)...")
+                deleted = create_unique_index(conn)
+                print(f"   ✓ {deleted} transacciones duplicadas eliminadas")
+                print("   ✓ Índice creado")
+
+                # Confirmar transacción
+                trans.commit()
+                print("\n✅ Migración completada exitosamente!")
+
+                return True
+
+            except Exception as e:
+                trans.rollback()
+                print(f"\n❌ Error durante la migración: {e}")
+                return False
+
+    except Exception as e:
+        print(f"\n❌ Error: {e}")
+        return False
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("  MIGRACIÓN: Transacciones únicas por usuario")
+    print("=" * 60)
+
+    success = migrate()
+
+    if success:
+        print("\n🎉 ¡Los duplicados se descartarán ahora en la base de datos!")
+        print("\nPróximos pasos:")
+        print("  1. Reinicia el backend: docker compose restart backend")
+        sys.exit(0)
+    else:
+        print("\n⚠️  La migración no se completó correctamente")
+        sys.exit(1)
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Boolean, Text, Index, desc, text
 from sqlalchemy.orm import relationship
 from database import Base
 from datetime import datetime
@@ -45,13 +45,13 @@ class Transaction(Base):
     id = Column(Integer, primary_key=True, index=True)
     
     # Usuario propietario
-    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
     
     # Información del banco
     bank_type = Column(String, nullable=False)  # kutxabank_account, kutxabank_card, openbank, imaginbank
     
     # Datos de la transacción
-    date = Column(DateTime, nullable=False, index=True)
+    date = Column(DateTime, nullable=False)
     description = Column(Text, nullable=False)
     amount = Column(Float, nullable=False)
     balance = Column(Float, nullable=True)
@@ -64,8 +64,8 @@ class Transaction(Base):
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=True)
     subcategory_id = Column(Integer, ForeignKey("subcategories.id"), nullable=True)
     
-    # Control de duplicados - hash del contenido importante
-    transaction_hash = Column(String, nullable=False, index=True)
+    # Control de duplicados - hash del contenido importante (único por usuario)
+    transaction_hash = Column(String, nullable=False)
     
     # Metadata
     created_at = Column(DateTime, default=datetime.utcnow)
@@ -74,6 +74,23 @@ class Transaction(Base):
     user = relationship("User")
     category = relationship("Category", back_populates="transactions")
     subcategory = relationship("Subcategory", back_populates="transactions")
+    
+    __table_args__ = (
+        Index('ix_transactions_user_hash', 'user_id', 'transaction_hash', unique=True),
+        # Índices de los listados e informes, que siempre filtran por usuario (también
+        # sirven para las consultas solo por user_id, que no tiene índice propio)
+        # (en bases de datos existentes se crean con migrate_transaction_indexes.py)
+        Index('ix_transactions_user_date', 'user_id', desc('date'), desc('id')),
+        Index('ix_transactions_user_bank_date', 'user_id', 'bank_type', desc('date'), desc('id')),
+        Index('ix_transactions_user_category', 'user_id', 'category_id'),
+        Index(
+            'ix_transactions_user_uncategorized', 'user_id', desc('date'), desc('id'),
+            sqlite_where=text('category_id IS NULL'),
+            postgresql_where=text('category_id IS NULL')
+        ),
+        Index('ix_transactions_user_amount', 'user_id', 'amount'),
+        Index('ix_transactions_user_description', 'user_id', 'description'),
+    )
 
 class StoreMapping(Base):
     """Mapeo de establecimientos a categorías para auto-categorización"""
@@ -89,3 +106,49 @@ class StoreMapping(Base):
     
     user = relationship("User")
     category = relationship("Category", back_populates="store_mappings")
+
+class ImportJob(Base):
+    """Trabajo de importación de extractos ejecutado en segundo plano"""
+    __tablename__ = "import_jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True)
+    
+    # pending, running, completed, failed
+    status = Column(String, nullable=False, default="pending")
+    bank_type = Column(String, nullable=True)  # Tipo indicado por el usuario (None = auto-detección)
+    
+    # Progreso y resultado (mismos campos que la respuesta de upload)
+    total_files = Column(Integer, nullable=False, default=0)
+    processed_files = Column(Integer, nullable=False, default=0)
+    total_rows = Column(Integer, nullable=False, default=0)
+    imported = Column(Integer, nullable=False, default=0)
+    duplicates = Column(Integer, nullable=False, default=0)
+    errors = Column(Integer, nullable=False, default=0)
+    success = Column(Boolean, nullable=True)
+    message = Column(Text, nullable=True)
+    
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    finished_at = Column(DateTime, nullable=True)
+    
+    user = relationship("User")
+    files = relationship("ImportJobFile", back_populates="job", cascade="all, delete-orphan", order_by="ImportJobFile.id")
+
+class ImportJobFile(Base):
+    """Estado de cada archivo dentro de un trabajo de importación"""
+    __tablename__ = "import_job_files"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_id = Column(Integer, ForeignKey("import_jobs.id", ondelete="CASCADE"), nullable=False, index=True)
+    filename = Column(String, nullable=False)
+    
+    # pending, parsing, inserting, completed, skipped, failed
+    status = Column(String, nullable=False, default="pending")
+    bank_type = Column(String, nullable=True)
+    total_rows = Column(Integer, nullable=False, default=0)
+    imported = Column(Integer, nullable=False, default=0)
+    duplicates = Column(Integer, nullable=False, default=0)
+    message = Column(Text, nullable=True)  # Línea de detalle del archivo (✓ / ⚠️ / ❌)
+    
+    job = relationship("ImportJob", back_populates="files")
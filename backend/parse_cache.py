@@ -0,0 +1,152 @@
+"""
+Caché en disco de extractos parseados, indexada por el SHA-256 del archivo.
+
+Cada entrada es una secuencia de objetos serializados uno tras otro (el tipo
+de banco y los lotes de transacciones), que se escribe y se lee por partes.
+"""
+import hashlib
+import os
+import pickle
+import tempfile
+from typing import Optional, Any, Iterator
+
+# Directorio de la caché (solo accesible por el servidor: las entradas se guardan con pickle)
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", "./data/parse_cache")
+
+# Tamaño máximo de la caché; al superarlo se eliminan las entradas menos usadas (0 = desactivada)
+PARSE_CACHE_MAX_BYTES = int(os.getenv("PARSE_CACHE_MAX_MB", "256")) * 1024 * 1024
+
+# Incrementar al cambiar el resultado de los parsers para invalidar las entradas antiguas
+CACHE_VERSION = 5
+
+_SUFFIX = '.pickle'
+
+
+def cache_key(file_content: bytes, bank_type: Optional[str] = None) -> str:
+    """Clave de la caché: versión, hash del contenido y tipo de banco indicado (o auto)"""
+    digest = hashlib.sha256(file_content).hexdigest()
+    return f"v{CACHE_VERSION}-{digest}-{bank_type or 'auto'}"
+
+
+def _path(key: str) -> str:
+    return os.path.join(PARSE_CACHE_DIR, key + _SUFFIX)
+
+
+def read(key: str) -> Optional[Iterator[Any]]:
+    """
+    Leer una entrada de la caché como la secuencia de objetos con que se
+    escribió, uno a uno (None si no existe)
+    """
+    if not PARSE_CACHE_MAX_BYTES:
+        return None
+
+    path = _path(key)
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    # Marcar como usada recientemente para la expulsión LRU
+    os.utime(path)
+    return _read_objects(key, path, f)
+
+
+def _read_objects(key: str, path: str, f) -> Iterator[Any]:
+    with f:
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
+            except Exception as e:
+                print(f"Entrada de caché inválida {key}: {e}")
+                _remove(path)
+                raise
+
+
+class CacheWriter:
+    """
+    Escritura de una entrada objeto a objeto (por ejemplo, lote a lote) sin
+    tenerla entera en memoria. La entrada solo es visible para otros procesos
+    tras commit(); si no se llega a confirmar, se descarta.
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.tmp_path = None
+        self.file = None
+        if not PARSE_CACHE_MAX_BYTES:
+            return
+        try:
+            os.makedirs(PARSE_CACHE_DIR, exist_ok=True)
+            fd, self.tmp_path = tempfile.mkstemp(dir=PARSE_CACHE_DIR, suffix='.tmp')
+            self.file = os.fdopen(fd, 'wb')
+        except Exception as e:
+            print(f"No se pudo guardar la entrada de caché {key}: {e}")
+            self.discard()
+
+    def write(self, value: Any):
+        if self.file is None:
+            return
+        try:
+            pickle.dump(value, self.file, protocol=pickle.HIGHEST_PROTOCOL)
+            # Una entrada mayor que la propia caché se expulsaría nada más guardarla
+            if self.file.tell() > PARSE_CACHE_MAX_BYTES:
+                self.discard()
+        except Exception as e:
+            print(f"No se pudo guardar la entrada de caché {self.key}: {e}")
+            self.discard()
+
+    def commit(self):
+        """Publicar la entrada (renombrando el temporal) y expulsar las antiguas"""
+        if self.file is None:
+            return
+        try:
+            self.file.close()
+            self.file = None
+            os.replace(self.tmp_path, _path(self.key))
+            self.tmp_path = None
+            _evict()
+        except Exception as e:
+            print(f"No se pudo guardar la entrada de caché {self.key}: {e}")
+            self.discard()
+
+    def discard(self):
+        """Abandonar la entrada a medio escribir"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.tmp_path is not None:
+            _remove(self.tmp_path)
+            self.tmp_path = None
+
+
+def _evict():
+    """Eliminar las entradas usadas hace más tiempo hasta respetar el tamaño máximo"""
+    entries = []
+    total_size = 0
+    with os.scandir(PARSE_CACHE_DIR) as it:
+        for entry in it:
+            if not entry.name.endswith(_SUFFIX):
+                continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total_size += stat.st_size
+
+    if total_size <= PARSE_CACHE_MAX_BYTES:
+        return
+
+    for _, size, path in sorted(entries):
+        _remove(path)
+        total_size -= size
+        if total_size <= PARSE_CACHE_MAX_BYTES:
+            break
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,205 @@
+"""Pool de procesos para parsear extractos sin bloquear el event loop"""
+import multiprocessing
+import os
+import queue
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Any, Iterator, AsyncIterator
+from starlette.concurrency import run_in_threadpool
+from parsed_transactions import TransactionBatch
+from bank_detector import BankDetector
+import parse_cache
+
+# Número de procesos dedicados al parseo (por defecto, hasta 4 según los núcleos)
+PARSER_WORKERS = max(1, int(os.getenv("PARSER_WORKERS", min(4, os.cpu_count() or 1))))
+
+# Lotes parseados que pueden esperar en la cola de cada archivo a ser insertados;
+# al llenarse, el proceso que parsea espera (la memoria no crece con el archivo)
+PARSE_QUEUE_BATCHES = 4
+
+# Cada cuánto se comprueba, mientras se espera un lote, si el proceso que parsea sigue vivo (segundos)
+PARSE_QUEUE_POLL_SECONDS = 1.0
+
+_executor: Optional[ProcessPoolExecutor] = None
+_manager = None
+
+
+def _warm_worker():
+    """Precargar las librerías de parseo al arrancar cada proceso"""
+    import parsers  # noqa: F401
+    import openpyxl  # noqa: F401
+    import xlrd  # noqa: F401
+
+
+def _ping() -> bool:
+    return True
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """Obtener (creando si hace falta) el pool de procesos compartido"""
+    global _executor
+    if _executor is None:
+        # spawn evita heredar el estado del servidor (conexiones, hilos) en los procesos hijos
+        _executor = ProcessPoolExecutor(
+            max_workers=PARSER_WORKERS,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_warm_worker
+        )
+    return _executor
+
+
+def get_manager():
+    """Obtener (creando si hace falta) el gestor de las colas de lotes entre procesos"""
+    global _manager
+    if _manager is None:
+        _manager = multiprocessing.get_context('spawn').Manager()
+    return _manager
+
+
+def start():
+    """Arrancar todos los procesos del pool para que la primera subida no pague el arranque"""
+    executor = get_executor()
+    for _ in range(PARSER_WORKERS):
+        executor.submit(_ping)
+    get_manager()
+
+
+def shutdown():
+    """Detener el pool de procesos"""
+    global _executor, _manager
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    if _manager is not None:
+        _manager.shutdown()
+        _manager = None
+
+
+def stream_statement(
+    file_content: bytes,
+    filename: str,
+    bank_type: Optional[str],
+    batches,
+    cancelled
+):
+    """
+    Detectar (si no se indica) el banco y parsear el archivo enviando el
+    resultado a la cola según se produce (se ejecuta en un proceso del pool):
+    primero el tipo de banco (None si no se pudo detectar, y ahí termina),
+    después los lotes de transacciones y, al final, None. Si algo falla, se
+    envía la excepción. Deja de parsear en cuanto se marca cancelled.
+    """
+    items = _statement_items(file_content, filename, bank_type)
+    try:
+        for item in items:
+            if cancelled.is_set():
+                return
+            batches.put(item)
+    except Exception as e:
+        batches.put(e)
+    finally:
+        items.close()
+
+
+def _statement_items(file_content: bytes, filename: str, bank_type: Optional[str]) -> Iterator[Any]:
+    """
+    Tipo de banco, lotes de transacciones y None final de un archivo.
+
+    Se guardan en la caché por contenido según se producen, de modo que
+    volver a subir el mismo extracto no repite la detección ni el parseo.
+    """
+    # Los parsers (pandas, lxml...) solo se importan en los procesos del pool
+    from parsers import get_parser
+
+    key = parse_cache.cache_key(file_content, bank_type)
+    cached = parse_cache.read(key)
+    if cached is not None:
+        yield from cached
+        return
+
+    # La detección devuelve la hoja ya leída de los Excel para que el parser la reutilice
+    sheet = None
+    if not bank_type:
+        bank_type, sheet = BankDetector.detect(file_content, filename)
+    yield bank_type
+    if not bank_type:
+        return
+
+    writer = parse_cache.CacheWriter(key)
+    try:
+        writer.write(bank_type)
+        for batch in get_parser(bank_type).iter_batches(file_content, sheet=sheet):
+            writer.write(batch)
+            yield batch
+        writer.write(None)
+        writer.commit()
+    finally:
+        writer.discard()
+    yield None
+
+
+class StatementStream:
+    """
+    Parseo de un archivo en el pool cuyo resultado se recibe por partes:
+    el tipo de banco y, después, los lotes de transacciones según se parsean.
+    """
+
+    def __init__(self, file_content: bytes, filename: str, bank_type: Optional[str] = None):
+        manager = get_manager()
+        self.batches = manager.Queue(maxsize=PARSE_QUEUE_BATCHES)
+        self.cancelled = manager.Event()
+        # Future del pool (no de asyncio): cancel() solo tiene éxito si aún no ha empezado
+        self.future = get_executor().submit(
+            stream_statement, file_content, filename, bank_type, self.batches, self.cancelled
+        )
+        self.finished = False
+
+    async def _next(self) -> Any:
+        """Siguiente elemento de la cola; una excepción si el parseo falló"""
+        while True:
+            try:
+                item = await run_in_threadpool(self.batches.get, True, PARSE_QUEUE_POLL_SECONDS)
+                break
+            except queue.Empty:
+                if not self.future.done():
+                    continue
+            # El proceso terminó: lo que envió ya está en la cola
+            try:
+                item = self.batches.get_nowait()
+            except queue.Empty:
+                error = None if self.future.cancelled() else self.future.exception()
+                item = error or RuntimeError("El parseo terminó sin enviar el resultado")
+            break
+        if isinstance(item, Exception):
+            self.finished = True
+            raise item
+        return item
+
+    async def read_bank_type(self) -> Optional[str]:
+        """Tipo de banco del archivo (None si no se pudo detectar)"""
+        bank_type = await self._next()
+        if bank_type is None:
+            self.finished = True
+        return bank_type
+
+    async def __aiter__(self) -> AsyncIterator[TransactionBatch]:
+        """Lotes de transacciones, hasta el final del archivo"""
+        while not self.finished:
+            batch = await self._next()
+            if batch is None:
+                self.finished = True
+                return
+            yield batch
+
+    async def close(self):
+        """
+        Detener el parseo y descartar lo que quede sin leer para que el
+        proceso que parsea no se quede esperando con la cola llena
+        """
+        if self.finished or self.future.cancel():
+            return
+        self.cancelled.set()
+        try:
+            async for _ in self:
+                pass
+        except Exception:
+            pass
@@ -0,0 +1,113 @@
+"""Transacciones parseadas de los extractos: registros por fila y lotes por columnas"""
+from datetime import datetime
+from typing import List, Dict, Any, Iterator, Optional
+
+
+class ParsedTransaction:
+    """
+    Transacción leída de un extracto. Con __slots__ cada fila ocupa bastante
+    menos memoria y se construye más rápido que un diccionario con sus claves.
+    """
+
+    __slots__ = (
+        'bank_type', 'date', 'description', 'amount', 'balance',
+        'reference', 'extra_info', 'transaction_hash'
+    )
+
+    def __init__(
+        self,
+        bank_type: str,
+        date: datetime,
+        description: str,
+        amount: float,
+        balance: Optional[float] = None,
+        reference: Optional[str] = None,
+        extra_info: Optional[str] = None,
+        transaction_hash: Optional[str] = None
+    ):
+        self.bank_type = bank_type
+        self.date = date
+        self.description = description
+        self.amount = amount
+        self.balance = balance
+        self.reference = reference
+        self.extra_info = extra_info
+        self.transaction_hash = transaction_hash
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Campos de la transacción como diccionario"""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self) -> str:
+        return (
+            f"ParsedTransaction({self.bank_type}, {self.date}, "
+            f"{self.description!r}, {self.amount})"
+        )
+
+
+class TransactionBatch:
+    """
+    Lote de transacciones de un mismo banco guardado por columnas (una lista
+    por campo), tal como lo producen los parsers y lo inserta la importación,
+    sin construir un diccionario por fila.
+    """
+
+    __slots__ = (
+        'bank_type', 'dates', 'descriptions', 'amounts', 'balances',
+        'references', 'extra_infos', 'hashes'
+    )
+
+    def __init__(
+        self,
+        bank_type: str,
+        dates: Optional[list] = None,
+        descriptions: Optional[List[str]] = None,
+        amounts: Optional[List[float]] = None,
+        balances: Optional[List[Optional[float]]] = None,
+        references: Optional[List[Optional[str]]] = None,
+        extra_infos: Optional[List[Optional[str]]] = None,
+        hashes: Optional[List[str]] = None
+    ):
+        self.bank_type = bank_type
+        self.dates = dates if dates is not None else []
+        size = len(self.dates)
+        self.descriptions = descriptions if descriptions is not None else []
+        self.amounts = amounts if amounts is not None else []
+        # Las columnas opcionales que el banco no tiene se rellenan con None
+        self.balances = balances if balances is not None else [None] * size
+        self.references = references if references is not None else [None] * size
+        self.extra_infos = extra_infos if extra_infos is not None else [None] * size
+        self.hashes = hashes if hashes is not None else []
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    def slice(self, start: int, stop: int) -> 'TransactionBatch':
+        return TransactionBatch(
+            self.bank_type,
+            self.dates[start:stop],
+            self.descriptions[start:stop],
+            self.amounts[start:stop],
+            self.balances[start:stop],
+            self.references[start:stop],
+            self.extra_infos[start:stop],
+            self.hashes[start:stop]
+        )
+
+    def split(self, size: int) -> Iterator['TransactionBatch']:
+        """Partir en lotes de como mucho size filas (ninguno si está vacío)"""
+        if len(self) <= size:
+            if len(self):
+                yield self
+            return
+        for start in range(0, len(self), size):
+            yield self.slice(start, start + size)
+
+    def rows(self) -> Iterator[ParsedTransaction]:
+        """Transacciones fila a fila"""
+        bank_type = self.bank_type
+        for row in zip(
+            self.dates, self.descriptions, self.amounts, self.balances,
+            self.references, self.extra_infos, self.hashes
+        ):
+            yield ParsedTransaction(bank_type, *row)
@@ -1,61 +1,357 @@
 import pandas as pd
+import numpy as np
 import hashlib
-from datetime import datetime
-from typing import List, Dict, Any
-from abc import ABC, abstractmethod
-import chardet
+import os
+from datetime import date, datetime, time
+from typing import List, Dict, Callable, Optional, Tuple, Iterator, Type
+from itertools import islice
+from abc import ABC
 from io import BytesIO
-from lxml import html
+import codecs
+from pandas.io.parsers import TextParser
+from lxml import etree
 import re
+from bank_detector import BankDetector
+import text_encoding
+from parsed_transactions import ParsedTransaction, TransactionBatch
+
+try:
+    from python_calamine import CalamineWorkbook
+except ImportError:
+    CalamineWorkbook = None
+
+# Lector de los Excel: 'calamine' (python-calamine, si está instalado) o 'pandas' (xlrd/openpyxl)
+EXCEL_ENGINE = os.getenv("EXCEL_ENGINE", "calamine").lower()
+
+
+def read_excel_cells(file_content: bytes, engine: Optional[str] = None) -> List[list]:
+    """
+    Leer la primera hoja de un Excel una sola vez y devolver sus celdas tal
+    cual las entrega el engine (sin convertir tipos ni valores vacíos).
+
+    Con EXCEL_ENGINE=calamine (por defecto) se usa python-calamine si está
+    instalado; si no lo está o no puede leer el archivo, se usan los engines
+    de pandas (xlrd/openpyxl), que devuelven las mismas celdas.
+    """
+    if (engine or EXCEL_ENGINE) == 'calamine':
+        cells = read_calamine_cells(file_content)
+        if cells is not None:
+            return cells
+    return read_pandas_cells(file_content)
+
+
+def read_calamine_cells(file_content: bytes) -> Optional[List[list]]:
+    """Celdas de la primera hoja con python-calamine (None si no está instalado o falla)"""
+    if CalamineWorkbook is None:
+        return None
+    try:
+        workbook = CalamineWorkbook.from_filelike(BytesIO(file_content))
+        rows = workbook.get_sheet_by_index(0).to_python(skip_empty_area=False)
+    except Exception:
+        return None
+    return [[_pandas_cell(val) for val in row] for row in rows]
+
+
+def _pandas_cell(val):
+    """Valor de calamine con el tipo que le daría pd.read_excel"""
+    # pandas entrega los números enteros como int y las fechas sin hora como datetime
+    if type(val) is float and val.is_integer():
+        return int(val)
+    if type(val) is date:
+        return datetime.combine(val, time())
+    return val
+
+
+def read_pandas_cells(file_content: bytes) -> List[list]:
+    """
+    Celdas de la primera hoja con pd.read_excel. El engine se elige por la
+    firma del archivo (xlrd para XLS binario, openpyxl para XLSX); solo si no
+    se reconoce se prueban ambos.
+    """
+    options = {'header': None, 'dtype': object, 'na_filter': False}
+
+    if BankDetector.is_binary_xls(file_content):
+        df = pd.read_excel(BytesIO(file_content), engine='xlrd', **options)
+    elif BankDetector.is_xlsx(file_content):
+        df = pd.read_excel(BytesIO(file_content), engine='openpyxl', **options)
+    else:
+        try:
+            df = pd.read_excel(BytesIO(file_content), engine='xlrd', **options)
+        except Exception:
+            df = pd.read_excel(BytesIO(file_content), engine='openpyxl', **options)
+
+    return [
+        [val.to_pydatetime() if isinstance(val, pd.Timestamp) else val for val in row]
+        for row in df.astype(object).values.tolist()
+    ]
+
+
+def excel_frame(cells: List[list], header_row: Optional[int] = None) -> pd.DataFrame:
+    """
+    Construir, a partir de las celdas ya leídas, el mismo DataFrame que
+    devolvería pd.read_excel(header=header_row) sin volver a leer el archivo.
+    """
+    if not cells:
+        return pd.DataFrame()
+    rows = [list(row) for row in cells]
+    return TextParser(rows, header=header_row, skip_blank_lines=False).read()
+
+
+def find_header_row(raw: pd.DataFrame, matches: Callable[[str], bool]) -> Optional[int]:
+    """Índice de la primera fila cuyo texto (en minúsculas) cumple la condición"""
+    for idx, row in raw.iterrows():
+        row_str = ' '.join([str(val).lower() for val in row if pd.notna(val)])
+        if matches(row_str):
+            return idx
+    return None
+
+
+# --- Conversión vectorizada de columnas ---
+# Los roles de columna (fecha, descripción, importe, saldo...) se resuelven una
+# vez por archivo y cada columna se convierte entera con operaciones de pandas.
+
+def find_columns(df: pd.DataFrame, matches: Callable[[str], bool]) -> List[pd.Series]:
+    """Columnas (en orden) cuyo nombre en minúsculas cumple la condición"""
+    return [
+        df.iloc[:, position]
+        for position, col in enumerate(df.columns)
+        if matches(str(col).lower())
+    ]
+
+
+def find_column(df: pd.DataFrame, matches: Callable[[str], bool], default: Optional[int] = None) -> Optional[pd.Series]:
+    """Primera columna cuyo nombre cumple la condición, o la de la posición por defecto"""
+    columns = find_columns(df, matches)
+    if columns:
+        return columns[0]
+    if default is not None and default < len(df.columns):
+        return df.iloc[:, default]
+    return None
+
+
+def to_dates(series: pd.Series, date_format: Optional[str] = None) -> pd.Series:
+    """
+    Convertir una columna a fechas (NaT si no se puede): los textos con el
+    formato indicado (o interpretando cada uno por separado si no se indica)
+    y los valores que ya son fechas tal cual.
+    """
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return series
+
+    is_text = series.map(lambda val: isinstance(val, str))
+    text_dates = pd.to_datetime(
+        series.where(is_text),
+        format=date_format or 'mixed',
+        errors='coerce'
+    )
+    other_dates = pd.to_datetime(series.where(~is_text), errors='coerce')
+    return text_dates.where(is_text, other_dates)
+
+
+def to_text(series: pd.Series) -> pd.Series:
+    """Convertir una columna a texto sin espacios en los extremos (vacías como 'nan')"""
+    return series.map(str).str.strip()
+
+
+def present_text(series: pd.Series) -> pd.Series:
+    """Texto de la columna con las celdas vacías ('nan') como NaN"""
+    text = to_text(series).astype(object)
+    return text.where(text != 'nan')
+
+
+def non_empty_text(series: pd.Series) -> pd.Series:
+    """Texto de la columna con las celdas vacías o en blanco como NaN"""
+    text = present_text(series)
+    return text.where(text != '')
+
+
+def numeric_cells(series: pd.Series) -> pd.Series:
+    """Solo las celdas que ya son numéricas (int/float) como float; el resto NaN"""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    if series.dtype == object:
+        is_number = series.map(lambda val: isinstance(val, (int, float)))
+        return series.where(is_number).astype(float)
+    return pd.Series(np.nan, index=series.index)
+
+
+def to_float(series: pd.Series) -> pd.Series:
+    """Convertir una columna a float (NaN si el valor no es numérico)"""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    if series.dtype != object:
+        return pd.Series(np.nan, index=series.index)
+    # Las fechas no cuentan como importe aunque to_numeric sepa convertirlas
+    series = series.where(series.map(lambda val: isinstance(val, (str, int, float))))
+    return pd.to_numeric(series, errors='coerce').astype(float)
+
+
+def parse_spanish_amounts(series: pd.Series) -> pd.Series:
+    """Convertir importes en formato español ('-1.234,56EUR') a float"""
+    if pd.api.types.is_numeric_dtype(series):
+        return series.astype(float)
+    text = series.astype(str).str.replace('EUR', '', regex=False).str.strip()
+    text = text.str.replace('.', '', regex=False).str.replace(',', '.', regex=False)
+    return pd.to_numeric(text, errors='coerce').astype(float)
+
+
+def first_valid(columns: List[pd.Series], index: pd.Index) -> pd.Series:
+    """Por cada fila, el primer valor no vacío de las columnas indicadas (en orden)"""
+    if not columns:
+        return pd.Series(np.nan, index=index, dtype=object)
+    result = columns[0]
+    for column in columns[1:]:
+        result = result.where(result.notna(), column)
+    return result
+
+
+def join_columns(columns: List[pd.Series], sep: str, index: pd.Index) -> pd.Series:
+    """Unir por fila los textos no vacíos de varias columnas (NaN si no hay ninguno)"""
+    parts = [non_empty_text(column) for column in columns]
+    if not parts:
+        return pd.Series(np.nan, index=index, dtype=object)
+    joined = parts[0]
+    for part in parts[1:]:
+        joined = (joined + sep + part).fillna(joined).fillna(part)
+    return joined.astype(object)
+
+
+def first_two_numbers(columns: List[pd.Series]) -> Tuple[np.ndarray, np.ndarray]:
+    """Por cada fila, el primer y el segundo valor numérico de las columnas (en orden)"""
+    values = np.column_stack([column.to_numpy(dtype=float) for column in columns])
+    present = ~np.isnan(values)
+    rows = np.arange(len(values))
+
+    first = present.argmax(axis=1)
+    has_first = present[rows, first]
+    present[rows, first] = False
+    second = present.argmax(axis=1)
+    has_second = has_first & present[rows, second]
+
+    return (
+        np.where(has_first, values[rows, first], np.nan),
+        np.where(has_second, values[rows, second], np.nan)
+    )
+
+
+def iso_dates(dates: pd.Series) -> pd.Series:
+    """Fechas en el mismo formato que datetime.isoformat() / Timestamp.isoformat()"""
+    text = pd.Series(
+        np.datetime_as_string(dates.to_numpy(dtype='datetime64[ns]'), unit='s'),
+        index=dates.index,
+        dtype=object
+    )
+
+    # Fracción de segundo solo donde la haya (microsegundos y, si hay, nanosegundos)
+    microseconds = dates.dt.microsecond
+    nanoseconds = dates.dt.nanosecond
+    has_fraction = (microseconds != 0) | (nanoseconds != 0)
+    if has_fraction.any():
+        fraction = '.' + microseconds[has_fraction].astype(str).str.zfill(6)
+        with_nanoseconds = nanoseconds[has_fraction] != 0
+        fraction = fraction.where(
+            ~with_nanoseconds,
+            fraction + nanoseconds[has_fraction].astype(str).str.zfill(3)
+        )
+        text[has_fraction] = text[has_fraction] + fraction
+
+    return text
+
+
+def optional_floats(values) -> List[Optional[float]]:
+    """Lista de floats con None en lugar de NaN"""
+    return [None if pd.isna(value) else float(value) for value in values]
+
+
+def optional_texts(values) -> List[Optional[str]]:
+    """Lista de textos con None en lugar de NaN"""
+    return [value if pd.notna(value) else None for value in values]
+
+
+def py_datetimes(dates: pd.Series) -> list:
+    """Fechas como datetime de Python (sin nanosegundos)"""
+    return dates.to_numpy(dtype='datetime64[us]').astype(object).tolist()
+
+
+# Filas leídas por lote en los formatos que se parsean por partes (CSV, HTML)
+BATCH_ROWS = 5000
+
 
 class BaseParser(ABC):
     """Clase base para parsers de CSV de bancos"""
     
-    @abstractmethod
-    def parse(self, file_content: bytes) -> List[Dict[str, Any]]:
-        """Parsear el contenido del CSV y devolver lista de transacciones"""
-        pass
+    def parse(self, file_content: bytes, sheet: Optional[List[list]] = None) -> List[ParsedTransaction]:
+        """Parsear el contenido del archivo y devolver lista de transacciones"""
+        return [row for batch in self.iter_batches(file_content, sheet) for row in batch.rows()]
+    
+    def iter_batches(self, file_content: bytes, sheet: Optional[List[list]] = None) -> Iterator[TransactionBatch]:
+        """
+        Parsear el archivo en lotes por columnas de BATCH_ROWS transacciones
+        como mucho, según se van parseando.
+        
+        sheet son las celdas de la hoja si el detector ya leyó el Excel
+        (BankDetector.detect), para no volver a leerlo.
+        
+        Los formatos que se leen por partes (CSV, HTML) redefinen este método;
+        el resto se parsea de una vez con parse_batch y se reparte en lotes.
+        """
+        yield from self.parse_batch(file_content, sheet).split(BATCH_ROWS)
+    
+    def parse_batch(self, file_content: bytes, sheet: Optional[List[list]] = None) -> TransactionBatch:
+        """Parsear el archivo completo en un único lote"""
+        raise NotImplementedError
     
     def detect_encoding(self, file_content: bytes) -> str:
         """Detectar la codificación del archivo"""
-        result = chardet.detect(file_content)
-        return result['encoding'] or 'utf-8'
+        return text_encoding.detect_encoding(file_content)
     
     def generate_hash(self, date: datetime, description: str, amount: float, bank_type: str) -> str:
         """Generar hash único para detectar duplicados"""
         hash_string = f"{date.isoformat()}{description}{amount}{bank_type}"
         return hashlib.sha256(hash_string.encode()).hexdigest()
+    
+    def generate_hashes(self, dates: pd.Series, descriptions: pd.Series, amounts: List[float], bank_type: str) -> List[str]:
+        """
+        Generar los hashes de todas las transacciones de un archivo a la vez.
+        
+        Construye las cadenas con operaciones de columna y devuelve
+        exactamente los mismos valores que generate_hash fila a fila, para que
+        las transacciones ya importadas se sigan detectando como duplicadas.
+        """
+        if len(dates) == 0:
+            return []
+        
+        hash_strings = (
+            iso_dates(pd.Series(dates).reset_index(drop=True))
+            # map(str): como en el f-string de generate_hash, None pasa a ser 'None'
+            + pd.Series(descriptions, dtype=object).reset_index(drop=True).map(str)
+            + pd.Series(amounts, dtype=float).reset_index(drop=True).astype(str)
+            + bank_type
+        )
+        
+        sha256 = hashlib.sha256
+        return [sha256(hash_string.encode()).hexdigest() for hash_string in hash_strings]
 
 class KutxabankAccountParser(BaseParser):
     """Parser para extractos de cuenta corriente de Kutxabank"""
     
-    def parse(self, file_content: bytes) -> List[Dict[str, Any]]:
+    def parse_batch(self, file_content: bytes, sheet: Optional[List[list]] = None) -> TransactionBatch:
         try:
             # Kutxabank cuenta es un archivo XLS/XLSX binario
-            # Intentar primero con xlrd (archivos .xls antiguos)
-            # Si falla, intentar con openpyxl (archivos .xlsx modernos)
-            try:
-                df = pd.read_excel(BytesIO(file_content), engine='xlrd', header=None)
-            except:
-                df = pd.read_excel(BytesIO(file_content), engine='openpyxl', header=None)
+            cells = sheet if sheet is not None else read_excel_cells(file_content)
+            raw = excel_frame(cells)
             
             # Buscar la fila con los encabezados (fecha, concepto, etc.)
-            header_row = None
-            for idx, row in df.iterrows():
-                row_str = ' '.join([str(val).lower() for val in row if pd.notna(val)])
-                if 'fecha' in row_str and 'concepto' in row_str and 'importe' in row_str:
-                    header_row = idx
-                    break
+            header_row = find_header_row(
+                raw,
+                lambda row_str: 'fecha' in row_str and 'concepto' in row_str and 'importe' in row_str
+            )
             
             if header_row is None:
                 raise ValueError("No se encontró la fila de encabezados en el archivo de Kutxabank")
             
-            # Leer de nuevo sin skiprows, usando el header_row como header
-            # pandas automáticamente usará esa fila como nombres de columnas
-            try:
-                df = pd.read_excel(BytesIO(file_content), engine='xlrd', header=header_row)
-            except:
-                df = pd.read_excel(BytesIO(file_content), engine='openpyxl', header=header_row)
+            # Usar esa fila como nombres de columnas sin volver a leer el archivo
+            df = excel_frame(cells, header_row)
             
             # Limpiar: remover filas vacías
             df = df.dropna(how='all')
@@ -63,75 +359,37 @@ class KutxabankAccountParser(BaseParser):
             # Resetear el índice después de limpiar
             df = df.reset_index(drop=True)
             
-            transactions = []
+            if len(df.columns) < 2:
+                return TransactionBatch('kutxabank_account')
             
             # Formato Kutxabank: fecha, concepto, fecha valor, importe, saldo
-            for _, row in df.iterrows():
-                try:
-                    # Saltar filas con NaN en la primera columna (fecha)
-                    if pd.isna(row.iloc[0]):
-                        continue
-                    
-                    # La primera columna suele ser la fecha
-                    date_val = row.iloc[0]
-                    
-                    # Si es string, parsear
-                    if isinstance(date_val, str):
-                        date = pd.to_datetime(date_val, format='%d/%m/%Y', errors='coerce')
-                    else:
-                        # Si ya es datetime
-                        date = pd.to_datetime(date_val, errors='coerce')
-                    
-                    if pd.isna(date):
-                        continue
-                    
-                    # Segunda columna: concepto/descripción
-                    description = str(row.iloc[1]).strip()
-                    if description == 'nan' or not description:
-                        continue
-                    
-                    # Buscar la columna de importe (generalmente columna -2 o -1)
-                    # y saldo (última columna)
-                    amount = None
-                    balance = None
-                    
-                    # Intentar obtener importe (penúltima o antepenúltima columna)
-                    for i in [-2, -1, 3]:
-                        if i < len(row):
-                            val = row.iloc[i]
-                            if pd.notna(val) and isinstance(val, (int, float)):
-                                if amount is None:
-                                    amount = float(val)
-                                elif balance is None:
-                                    balance = float(val)
-                                    break
-                    
-                    if amount is None:
-                        continue
-                    
-                    transaction = {
-                        'bank_type': 'kutxabank_account',
-                        'date': date.to_pydatetime(),
-                        'description': description,
-                        'amount': amount,
-                        'balance': balance,
-                        'reference': None,
-                        'extra_info': None
-                    }
-                    
-                    transaction['transaction_hash'] = self.generate_hash(
-                        transaction['date'],
-                        transaction['description'],
-                        transaction['amount'],
-                        transaction['bank_type']
-                    )
-                    
-                    transactions.append(transaction)
-                except Exception as e:
-                    print(f"Error parsing row: {e}")
-                    continue
-            
-            return transactions
+            dates = to_dates(df.iloc[:, 0], '%d/%m/%Y')
+            descriptions = to_text(df.iloc[:, 1])
+            
+            # Importe y saldo: primeros valores numéricos de la penúltima,
+            # última y cuarta columna (en ese orden)
+            positions = [-2, -1] + ([3] if len(df.columns) > 3 else [])
+            amounts, balances = first_two_numbers([numeric_cells(df.iloc[:, i]) for i in positions])
+            
+            valid = (
+                dates.notna() & (descriptions != 'nan') & (descriptions != '') &
+                pd.notna(amounts)
+            ).to_numpy()
+            
+            # Las fechas se guardan como datetime (sin nanosegundos)
+            dates = dates[valid].dt.floor('us')
+            descriptions = descriptions[valid]
+            amounts = amounts[valid].tolist()
+            hashes = self.generate_hashes(dates, descriptions, amounts, 'kutxabank_account')
+            
+            return TransactionBatch(
+                'kutxabank_account',
+                dates=py_datetimes(dates),
+                descriptions=descriptions.tolist(),
+                amounts=amounts,
+                balances=optional_floats(balances[valid]),
+                hashes=hashes
+            )
         except Exception as e:
             print(f"Error reading Kutxabank account file: {e}")
             raise ValueError(f"No se pudo leer el archivo de Kutxabank: {e}")
@@ -139,32 +397,23 @@ class KutxabankAccountParser(BaseParser):
 class KutxabankCardParser(BaseParser):
     """Parser para extractos de tarjeta de crédito de Kutxabank"""
     
-    def parse(self, file_content: bytes) -> List[Dict[str, Any]]:
+    def parse_batch(self, file_content: bytes, sheet: Optional[List[list]] = None) -> TransactionBatch:
         try:
             # Kutxabank tarjeta es un archivo XLS/XLSX binario
-            # Intentar primero con xlrd (archivos .xls antiguos)
-            # Si falla, intentar con openpyxl (archivos .xlsx modernos)
-            try:
-                df = pd.read_excel(BytesIO(file_content), engine='xlrd', header=None)
-            except:
-                df = pd.read_excel(BytesIO(file_content), engine='openpyxl', header=None)
+            cells = sheet if sheet is not None else read_excel_cells(file_content)
+            raw = excel_frame(cells)
             
             # Buscar la fila con los encabezados (fecha, concepto, etc.)
-            header_row = None
-            for idx, row in df.iterrows():
-                row_str = ' '.join([str(val).lower() for val in row if pd.notna(val)])
-                if 'fecha' in row_str and 'concepto' in row_str:
-                    header_row = idx
-                    break
+            header_row = find_header_row(
+                raw,
+                lambda row_str: 'fecha' in row_str and 'concepto' in row_str
+            )
             
             if header_row is None:
                 raise ValueError("No se encontró la fila de encabezados en el archivo de tarjeta Kutxabank")
             
-            # Leer de nuevo sin skiprows, usando el header_row como header
-            try:
-                df = pd.read_excel(BytesIO(file_content), engine='xlrd', header=header_row)
-            except:
-                df = pd.read_excel(BytesIO(file_content), engine='openpyxl', header=header_row)
+            # Usar esa fila como nombres de columnas sin volver a leer el archivo
+            df = excel_frame(cells, header_row)
             
             # Limpiar: remover filas vacías
             df = df.dropna(how='all')
@@ -172,100 +421,113 @@ class KutxabankCardParser(BaseParser):
             # Resetear el índice después de limpiar
             df = df.reset_index(drop=True)
             
-            transactions = []
+            if len(df.columns) < 2:
+                return TransactionBatch('kutxabank_card')
             
             # Formato típico de tarjeta: fecha, concepto, fecha valor, importe
-            for _, row in df.iterrows():
-                try:
-                    # Saltar filas con NaN en la primera columna (fecha)
-                    if pd.isna(row.iloc[0]):
-                        continue
-                    
-                    # Primera columna: fecha operación
-                    date_val = row.iloc[0]
-                    if isinstance(date_val, str):
-                        date = pd.to_datetime(date_val, format='%d/%m/%Y', errors='coerce')
-                    else:
-                        date = pd.to_datetime(date_val, errors='coerce')
-                    
-                    if pd.isna(date):
-                        continue
-                    
-                    # Segunda columna: concepto
-                    description = str(row.iloc[1]).strip()
-                    if description == 'nan' or not description:
-                        continue
-                    
-                    # Última columna: importe (ya es float)
-                    amount = row.iloc[-1]
-                    if pd.isna(amount):
-                        continue
-                    
-                    amount = float(amount)
-                    
-                    transaction = {
-                        'bank_type': 'kutxabank_card',
-                        'date': date.to_pydatetime(),
-                        'description': description,
-                        'amount': amount,
-                        'balance': None,
-                        'reference': None,
-                        'extra_info': None
-                    }
-                    
-                    transaction['transaction_hash'] = self.generate_hash(
-                        transaction['date'],
-                        transaction['description'],
-                        transaction['amount'],
-                        transaction['bank_type']
-                    )
-                    
-                    transactions.append(transaction)
-                except Exception as e:
-                    print(f"Error parsing row: {e}")
-                    continue
-            
-            return transactions
+            dates = to_dates(df.iloc[:, 0], '%d/%m/%Y')
+            descriptions = to_text(df.iloc[:, 1])
+            
+            # Última columna: importe
+            amounts = to_float(df.iloc[:, -1])
+            
+            valid = dates.notna() & (descriptions != 'nan') & (descriptions != '') & amounts.notna()
+            
+            # Las fechas se guardan como datetime (sin nanosegundos)
+            dates = dates[valid].dt.floor('us')
+            descriptions = descriptions[valid]
+            amounts = amounts[valid].tolist()
+            hashes = self.generate_hashes(dates, descriptions, amounts, 'kutxabank_card')
+            
+            return TransactionBatch(
+                'kutxabank_card',
+                dates=py_datetimes(dates),
+                descriptions=descriptions.tolist(),
+                amounts=amounts,
+                hashes=hashes
+            )
         except Exception as e:
             print(f"Error reading Kutxabank card file: {e}")
             raise ValueError(f"No se pudo leer el archivo de tarjeta Kutxabank: {e}")
 
+# Openbank: marca de HTML, textos de las celdas de una fila y tamaño de los bloques que se parsean
+HTML_TAG = re.compile(rb'<html', re.IGNORECASE)
+OPENBANK_CELL_TEXT = etree.XPath('.//td//font/text() | .//td/text()')
+HTML_CHUNK_BYTES = 64 * 1024
+
+
 class OpenbankParser(BaseParser):
     """Parser para extractos de Openbank (HTML disfrazado como XLS)"""
     
-    def parse(self, file_content: bytes) -> List[Dict[str, Any]]:
+    def iter_batches(self, file_content: bytes, sheet: Optional[List[list]] = None) -> Iterator[TransactionBatch]:
         try:
             # Openbank exporta HTML con extensión .xls
             # Intentar leer como HTML primero
             encoding = self.detect_encoding(file_content)
-            content = file_content.decode(encoding, errors='ignore')
             
             # Si es HTML, parsear la tabla
-            if '<html' in content.lower():
-                return self._parse_html(content)
+            if HTML_TAG.search(file_content):
+                transactions = self._iter_html(file_content, encoding)
+                while True:
+                    rows = list(islice(transactions, BATCH_ROWS))
+                    if not rows:
+                        break
+                    dates, descriptions, amounts, balances = (list(column) for column in zip(*rows))
+                    yield TransactionBatch(
+                        'openbank',
+                        dates=dates,
+                        descriptions=descriptions,
+                        amounts=amounts,
+                        balances=balances,
+                        hashes=self.generate_hashes(pd.Series(dates), descriptions, amounts, 'openbank')
+                    )
             else:
                 # Si no es HTML, intentar como CSV
-                return self._parse_csv(file_content, encoding)
+                yield from self._iter_csv(file_content, encoding)
         except Exception as e:
             print(f"Error reading Openbank file: {e}")
             raise ValueError(f"No se pudo leer el archivo de Openbank: {e}")
     
-    def _parse_html(self, content: str) -> List[Dict[str, Any]]:
-        """Parsear archivo HTML de Openbank"""
-        transactions = []
+    def _iter_html_rows(self, file_content: bytes, encoding: str) -> Iterator[List[str]]:
+        """
+        Textos no vacíos de cada fila <tr> del HTML, por orden.
         
+        El archivo se decodifica y se parsea por bloques de filas completas
+        (cortando tras el último </tr> de cada bloque), así que en memoria
+        solo está el árbol de un bloque y no crece con el tamaño del extracto.
+        El parser incremental de libxml2 no sirve aquí: con estos archivos
+        deja de emitir filas hasta el final y acaba construyendo el árbol entero.
+        """
+        decoder = codecs.getincrementaldecoder(encoding)(errors='ignore')
+        # Openbank repite los mismos id en todas las celdas: no registrarlos evita
+        # un error por celda que hace el parseo cuadrático
+        parser = etree.HTMLParser(collect_ids=False)
+        
+        def rows(block: str) -> Iterator[List[str]]:
+            if not block.strip():
+                return
+            tree = etree.fromstring(block, parser)
+            if tree is None:
+                return
+            for row in tree.iter('tr'):
+                yield [c.strip() for c in OPENBANK_CELL_TEXT(row) if c.strip()]
+        
+        pending = ''
+        for start in range(0, len(file_content), HTML_CHUNK_BYTES):
+            pending += decoder.decode(file_content[start:start + HTML_CHUNK_BYTES])
+            row_end = pending.lower().rfind('</tr')
+            if row_end >= 0:
+                row_end = pending.find('>', row_end)
+            if row_end >= 0:
+                yield from rows(pending[:row_end + 1])
+                pending = pending[row_end + 1:]
+        yield from rows(pending + decoder.decode(b'', final=True))
+    
+    def _iter_html(self, file_content: bytes, encoding: str) -> Iterator[Tuple[datetime, str, float, Optional[float]]]:
+        """Parsear archivo HTML de Openbank fila a fila: (fecha, concepto, importe, saldo)"""
         try:
-            tree = html.fromstring(content)
-            
-            # Buscar todas las filas de la tabla
-            # Openbank usa una tabla con las transacciones
-            rows = tree.xpath('//tr')
-            
             # Buscar las filas que contienen datos (tienen valores de fecha)
-            for row in rows:
-                cells = row.xpath('.//td//font/text() | .//td/text()')
-                cells = [c.strip() for c in cells if c.strip()]
-                
+            for cells in self._iter_html_rows(file_content, encoding):
                 if len(cells) < 4:
                     continue
                 
@@ -282,21 +544,10 @@ class OpenbankParser(BaseParser):
                     if pd.isna(date):
                         continue
                     
-                    # Buscar concepto (texto largo)
-                    # Buscar importe (número con posible signo negativo)
-                    # Buscar saldo (último número)
-                    
                     # Típicamente: [Fecha Op, Fecha Valor, Concepto, Importe, Saldo]
-                    if len(cells) >= 5:
-                        description = cells[2].strip()
-                        amount_str = cells[3].replace('.', '').replace(',', '.')
-                        balance_str = cells[4].replace('.', '').replace(',', '.')
-                    elif len(cells) == 4:
-                        description = cells[2].strip()
-                        amount_str = cells[3].replace('.', '').replace(',', '.')
-                        balance_str = None
-                    else:
-                        continue
+                    description = cells[2].strip()
+                    amount_str = cells[3].replace('.', '').replace(',', '.')
+                    balance_str = cells[4].replace('.', '').replace(',', '.') if len(cells) >= 5 else None
                     
                     try:
                         amount = float(amount_str)
@@ -310,299 +561,223 @@ class OpenbankParser(BaseParser):
                         except:
                             pass
                     
-                    transaction = {
-                        'bank_type': 'openbank',
-                        'date': date.to_pydatetime(),
-                        'description': description,
-                        'amount': amount,
-                        'balance': balance,
-                        'reference': None,
-                        'extra_info': None
-                    }
-                    
-                    transaction['transaction_hash'] = self.generate_hash(
-                        transaction['date'],
-                        transaction['description'],
-                        transaction['amount'],
-                        transaction['bank_type']
-                    )
-                    
-                    transactions.append(transaction)
                 except Exception as e:
                     continue
-            
-            return transactions
+                
+                yield date.to_pydatetime(), description, amount, balance
         except Exception as e:
             print(f"Error parsing Openbank HTML: {e}")
             raise ValueError(f"No se pudo parsear el HTML de Openbank: {e}")
     
-    def _parse_csv(self, file_content: bytes, encoding: str) -> List[Dict[str, Any]]:
-        """Parsear archivo CSV de Openbank (formato alternativo)"""
-        df = pd.read_csv(
+    def _iter_csv(self, file_content: bytes, encoding: str) -> Iterator[TransactionBatch]:
+        """Parsear archivo CSV de Openbank (formato alternativo) por lotes de filas"""
+        with pd.read_csv(
             BytesIO(file_content),
             encoding=encoding,
             sep=';',
-            decimal=',',
-            thousands='.'
+            dtype=str,
+            chunksize=BATCH_ROWS
+        ) as reader:
+            for df in reader:
+                batch = self._csv_batch(df)
+                if len(batch):
+                    yield batch
+    
+    def _csv_batch(self, df: pd.DataFrame) -> TransactionBatch:
+        """Transacciones de un bloque del CSV de Openbank"""
+        if len(df.columns) < 2:
+            return TransactionBatch('openbank')
+        
+        # Formato Openbank CSV: Fecha;Concepto;Cargo;Abono;Saldo
+        dates = to_dates(df.iloc[:, 0], '%d/%m/%Y')
+        descriptions = to_text(df.iloc[:, 1])
+        
+        # Openbank suele tener columnas separadas para cargo y abono
+        cargos = parse_spanish_amounts(df.iloc[:, 2]).fillna(0) if len(df.columns) > 2 else 0
+        abonos = parse_spanish_amounts(df.iloc[:, 3]).fillna(0) if len(df.columns) > 3 else 0
+        amounts = pd.Series(abonos - cargos, index=df.index, dtype=float)
+        balances = (
+            parse_spanish_amounts(df.iloc[:, 4]) if len(df.columns) > 4
+            else pd.Series(np.nan, index=df.index)
         )
         
-        transactions = []
+        valid = dates.notna()
         
-        # Formato Openbank CSV: Fecha;Concepto;Cargo;Abono;Saldo
-        for _, row in df.iterrows():
-            try:
-                date = pd.to_datetime(row.iloc[0], format='%d/%m/%Y', errors='coerce')
-                if pd.isna(date):
-                    continue
-                
-                description = str(row.iloc[1]).strip()
-                
-                # Openbank suele tener columnas separadas para cargo y abono
-                cargo = str(row.iloc[2]).replace('.', '').replace(',', '.') if len(row) > 2 else '0'
-                abono = str(row.iloc[3]).replace('.', '').replace(',', '.') if len(row) > 3 else '0'
-                
-                cargo_val = float(cargo) if cargo and cargo != '' else 0
-                abono_val = float(abono) if abono and abono != '' else 0
-                
-                amount = abono_val - cargo_val
-                balance = float(str(row.iloc[4]).replace('.', '').replace(',', '.')) if len(row) > 4 else None
-                
-                transaction = {
-                    'bank_type': 'openbank',
-                    'date': date.to_pydatetime(),
-                    'description': description,
-                    'amount': amount,
-                    'balance': balance,
-                    'reference': None,
-                    'extra_info': None
-                }
-                
-                transaction['transaction_hash'] = self.generate_hash(
-                    transaction['date'],
-                    transaction['description'],
-                    transaction['amount'],
-                    transaction['bank_type']
-                )
-                
-                transactions.append(transaction)
-            except Exception as e:
-                print(f"Error parsing row: {e}")
-                continue
+        # Las fechas se guardan como datetime (sin nanosegundos)
+        dates = dates[valid].dt.floor('us')
+        descriptions = descriptions[valid]
+        amounts = amounts[valid].tolist()
+        hashes = self.generate_hashes(dates, descriptions, amounts, 'openbank')
         
-        return transactions
+        return TransactionBatch(
+            'openbank',
+            dates=py_datetimes(dates),
+            descriptions=descriptions.tolist(),
+            amounts=amounts,
+            balances=optional_floats(balances[valid]),
+            hashes=hashes
+        )
 
 class ImaginbankParser(BaseParser):
     """Parser para extractos de Imaginbank"""
     
-    def parse(self, file_content: bytes) -> List[Dict[str, Any]]:
+    def iter_batches(self, file_content: bytes, sheet: Optional[List[list]] = None) -> Iterator[TransactionBatch]:
         try:
             # Detectar encoding
             encoding = self.detect_encoding(file_content)
             
             # Imaginbank proporciona CSVs con punto y coma como separador
-            df = pd.read_csv(
+            # y los importes con "EUR" al final (Concepto;Fecha;Importe;Saldo).
+            # Se leen por bloques para no cargar el archivo entero en memoria
+            with pd.read_csv(
                 BytesIO(file_content),
                 sep=';',
                 encoding=encoding,
-                decimal=',',
-                thousands='.',
-                parse_dates=[0],  # Primera columna es la fecha
-                dayfirst=True
-            )
-            
-            # Limpiar nombres de columnas
-            df.columns = df.columns.str.strip()
-            
-            # Limpiar filas vacías
-            df = df.dropna(how='all')
-            
-            transactions = []
-            
-            for _, row in df.iterrows():
-                try:
-                    # Fecha (primera columna)
-                    date = pd.to_datetime(row.iloc[0], errors='coerce')
-                    if pd.isna(date):
-                        continue
-                    
-                    # Descripción (segunda columna generalmente)
-                    description = str(row.iloc[1]).strip() if len(row) > 1 else ''
-                    if not description or description == 'nan':
-                        continue
-                    
-                    # Buscar importe
-                    amount = None
-                    balance = None
-                    
-                    # Recorrer las columnas buscando valores numéricos
-                    for i in range(2, len(row)):
-                        val = row.iloc[i]
-                        if pd.notna(val) and isinstance(val, (int, float)):
-                            if amount is None:
-                                amount = float(val)
-                            elif balance is None:
-                                balance = float(val)
-                    
-                    # Si no encontramos importe, saltar
-                    if amount is None:
-                        continue
-                    
-                    transaction_hash = self.generate_hash(date, description, amount, 'imaginbank')
-                    
-                    transactions.append({
-                        'bank_type': 'imaginbank',
-                        'date': date,
-                        'description': description,
-                        'amount': amount,
-                        'balance': balance,
-                        'transaction_hash': transaction_hash
-                    })
-                    
-                except (ValueError, IndexError, AttributeError) as e:
-                    print(f"Error procesando fila de Imaginbank: {e}")
-                    continue
-            
-            return transactions
+                dtype=str,
+                chunksize=BATCH_ROWS
+            ) as reader:
+                for df in reader:
+                    batch = self._batch(df)
+                    if len(batch):
+                        yield batch
             
         except Exception as e:
             raise ValueError(f"Error al parsear CSV de Imaginbank: {str(e)}")
+    
+    def _batch(self, df: pd.DataFrame) -> TransactionBatch:
+        """Transacciones de un bloque del CSV"""
+        # Limpiar nombres de columnas
+        df.columns = df.columns.str.strip()
+        
+        # Limpiar filas vacías
+        df = df.dropna(how='all').reset_index(drop=True)
+        
+        # Resolver las columnas por nombre (o por posición si no se encuentran)
+        date_col = find_column(df, lambda name: 'fecha' in name, default=0)
+        description_col = find_column(df, lambda name: 'concepto' in name, default=1)
+        amount_col = find_column(df, lambda name: 'importe' in name, default=2)
+        balance_col = find_column(df, lambda name: 'saldo' in name, default=3)
+        
+        if date_col is None or description_col is None or amount_col is None:
+            return TransactionBatch('imaginbank')
+        
+        dates = to_dates(date_col, '%d/%m/%Y')
+        descriptions = to_text(description_col)
+        amounts = parse_spanish_amounts(amount_col)
+        balances = (
+            parse_spanish_amounts(balance_col) if balance_col is not None
+            else pd.Series(np.nan, index=df.index)
+        )
+        
+        valid = dates.notna() & (descriptions != 'nan') & (descriptions != '') & amounts.notna()
+        
+        dates = dates[valid]
+        descriptions = descriptions[valid]
+        amounts = amounts[valid].tolist()
+        hashes = self.generate_hashes(dates, descriptions, amounts, 'imaginbank')
+        
+        return TransactionBatch(
+            'imaginbank',
+            dates=py_datetimes(dates),
+            descriptions=descriptions.tolist(),
+            amounts=amounts,
+            balances=optional_floats(balances[valid]),
+            hashes=hashes
+        )
 
 
 class BBVAParser(BaseParser):
     """Parser para extractos de BBVA"""
     
-    def parse(self, file_content: bytes) -> List[Dict[str, Any]]:
+    def parse_batch(self, file_content: bytes, sheet: Optional[List[list]] = None) -> TransactionBatch:
         try:
             # BBVA proporciona archivos Excel (.xlsx)
-            try:
-                df = pd.read_excel(BytesIO(file_content), engine='openpyxl', header=None)
-            except:
-                df = pd.read_excel(BytesIO(file_content), engine='xlrd', header=None)
+            cells = sheet if sheet is not None else read_excel_cells(file_content)
+            raw = excel_frame(cells)
             
             # Buscar la fila con los encabezados
             # BBVA tiene columnas como: F.Valor, Fecha, Concepto, Movimiento, Importe, Divisa, Disponible
-            header_row = None
-            for idx, row in df.iterrows():
-                row_str = ' '.join([str(val).lower() for val in row if pd.notna(val)])
-                if 'f.valor' in row_str or ('fecha' in row_str and 'concepto' in row_str and 'importe' in row_str):
-                    header_row = idx
-                    break
+            header_row = find_header_row(
+                raw,
+                lambda row_str: 'f.valor' in row_str or (
+                    'fecha' in row_str and 'concepto' in row_str and 'importe' in row_str
+                )
+            )
             
             if header_row is None:
                 raise ValueError("No se encontró la fila de encabezados en el archivo de BBVA")
             
-            # Leer usando la fila de encabezados encontrada
-            try:
-                df = pd.read_excel(BytesIO(file_content), engine='openpyxl', header=header_row)
-            except:
-                df = pd.read_excel(BytesIO(file_content), engine='xlrd', header=header_row)
+            # Usar la fila de encabezados encontrada sin volver a leer el archivo
+            df = excel_frame(cells, header_row)
             
             # Limpiar: remover filas vacías
             df = df.dropna(how='all')
             df = df.reset_index(drop=True)
             
-            transactions = []
-            
-            for _, row in df.iterrows():
-                try:
-                    # Buscar la columna de fecha (puede ser "F.Valor" o "Fecha")
-                    date = None
-                    description = None
-                    amount = None
-                    balance = None
-                    extra_info = []
-                    
-                    # Intentar obtener fecha de "F.Valor" o "Fecha"
-                    for col in df.columns:
-                        col_lower = str(col).lower()
-                        if 'f.valor' in col_lower or (col_lower == 'fecha' and date is None):
-                            date_val = row[col]
-                            if pd.notna(date_val):
-                                if isinstance(date_val, str):
-                                    date = pd.to_datetime(date_val, format='%d/%m/%Y', errors='coerce')
-                                else:
-                                    date = pd.to_datetime(date_val, errors='coerce')
-                                if pd.notna(date):
-                                    break
-                    
-                    if pd.isna(date):
-                        continue
-                    
-                    # Buscar concepto/descripción
-                    for col in df.columns:
-                        col_lower = str(col).lower()
-                        if 'concepto' in col_lower or 'descripción' in col_lower or 'descripcion' in col_lower:
-                            description = str(row[col]).strip()
-                            if description != 'nan':
-                                break
-                    
-                    # Si hay columna "Movimiento", añadirla a la descripción
-                    for col in df.columns:
-                        col_lower = str(col).lower()
-                        if 'movimiento' in col_lower:
-                            mov = str(row[col]).strip()
-                            if mov != 'nan' and mov:
-                                if description:
-                                    description = f"{description} - {mov}"
-                                else:
-                                    description = mov
-                                break
-                    
-                    if not description or description == 'nan':
-                        continue
-                    
-                    # Buscar importe
-                    for col in df.columns:
-                        col_lower = str(col).lower()
-                        if 'importe' in col_lower:
-                            amt = row[col]
-                            if pd.notna(amt) and amt != '':
-                                try:
-                                    amount = float(amt)
-                                    break
-                                except:
-                                    pass
-                    
-                    # Buscar saldo/disponible
-                    for col in df.columns:
-                        col_lower = str(col).lower()
-                        if 'disponible' in col_lower or 'saldo' in col_lower:
-                            bal = row[col]
-                            if pd.notna(bal) and bal != '':
-                                try:
-                                    balance = float(bal)
-                                    break
-                                except:
-                                    pass
-                    
-                    if amount is None:
-                        continue
-                    
-                    # Añadir observaciones si existen
-                    for col in df.columns:
-                        col_lower = str(col).lower()
-                        if 'observacion' in col_lower:
-                            obs = str(row[col]).strip()
-                            if obs != 'nan' and obs:
-                                extra_info.append(obs)
-                    
-                    transaction_hash = self.generate_hash(date, description, amount, 'bbva')
-                    
-                    transactions.append({
-                        'bank_type': 'bbva',
-                        'date': date,
-                        'description': description,
-                        'amount': amount,
-                        'balance': balance,
-                        'extra_info': ' | '.join(extra_info) if extra_info else None,
-                        'transaction_hash': transaction_hash
-                    })
-                    
-                except (ValueError, IndexError, AttributeError) as e:
-                    print(f"Error procesando fila de BBVA: {e}")
+            # Fecha de "F.Valor" (la primera que se pueda interpretar) o de
+            # "Fecha" cuando no hay ningún valor en las columnas anteriores
+            dates = pd.Series(pd.NaT, index=df.index, dtype='datetime64[ns]')
+            has_value = pd.Series(False, index=df.index)
+            for position, col in enumerate(df.columns):
+                col_lower = str(col).lower()
+                if 'f.valor' in col_lower:
+                    usable = dates.isna()
+                elif col_lower == 'fecha':
+                    usable = ~has_value
+                else:
                     continue
+                values = df.iloc[:, position]
+                usable &= values.notna()
+                dates = dates.where(~usable, to_dates(values, '%d/%m/%Y'))
+                has_value |= values.notna()
+            
+            # Concepto/descripción
+            descriptions = first_valid([
+                present_text(col)
+                for col in find_columns(
+                    df, lambda name: 'concepto' in name or 'descripción' in name or 'descripcion' in name
+                )
+            ], df.index)
+            
+            # Si hay columna "Movimiento", añadirla a la descripción
+            movements = first_valid(
+                [non_empty_text(col) for col in find_columns(df, lambda name: 'movimiento' in name)],
+                df.index
+            )
+            has_description = descriptions.notna() & (descriptions != '')
+            descriptions = (descriptions + ' - ' + movements).where(has_description, movements).where(
+                movements.notna(), descriptions
+            )
+            
+            # Importe y saldo/disponible
+            amounts = first_valid(
+                [to_float(col) for col in find_columns(df, lambda name: 'importe' in name)],
+                df.index
+            )
+            balances = first_valid(
+                [to_float(col) for col in find_columns(df, lambda name: 'disponible' in name or 'saldo' in name)],
+                df.index
+            )
+            
+            # Observaciones como información adicional
+            extra_info = join_columns(find_columns(df, lambda name: 'observacion' in name), ' | ', df.index)
+            
+            valid = dates.notna() & descriptions.notna() & (descriptions != '') & amounts.notna()
             
-            return transactions
+            dates = dates[valid]
+            descriptions = descriptions[valid]
+            amounts = amounts[valid].astype(float).tolist()
+            hashes = self.generate_hashes(dates, descriptions, amounts, 'bbva')
+            
+            return TransactionBatch(
+                'bbva',
+                dates=py_datetimes(dates),
+                descriptions=descriptions.tolist(),
+                amounts=amounts,
+                balances=optional_floats(balances[valid]),
+                extra_infos=optional_texts(extra_info[valid]),
+                hashes=hashes
+            )
             
         except Exception as e:
             raise ValueError(f"Error al parsear archivo de BBVA: {str(e)}")
@@ -611,31 +786,24 @@ class BBVAParser(BaseParser):
 class INGParser(BaseParser):
     """Parser para extractos de ING Direct"""
     
-    def parse(self, file_content: bytes) -> List[Dict[str, Any]]:
+    def parse_batch(self, file_content: bytes, sheet: Optional[List[list]] = None) -> TransactionBatch:
         try:
             # ING proporciona archivos Excel (.xls o .xlsx)
-            try:
-                df = pd.read_excel(BytesIO(file_content), engine='xlrd', header=None)
-            except:
-                df = pd.read_excel(BytesIO(file_content), engine='openpyxl', header=None)
+            cells = sheet if sheet is not None else read_excel_cells(file_content)
+            raw = excel_frame(cells)
             
             # Buscar la fila con los encabezados
             # ING tiene columnas como: F. VALOR, CATEGORÍA, SUBCATEGORÍA, DESCRIPCIÓN, IMPORTE (€), SALDO (€)
-            header_row = None
-            for idx, row in df.iterrows():
-                row_str = ' '.join([str(val).lower() for val in row if pd.notna(val)])
-                if 'f. valor' in row_str or ('categoria' in row_str and 'importe' in row_str):
-                    header_row = idx
-                    break
+            header_row = find_header_row(
+                raw,
+                lambda row_str: 'f. valor' in row_str or ('categoria' in row_str and 'importe' in row_str)
+            )
             
             if header_row is None:
                 raise ValueError("No se encontró la fila de encabezados en el archivo de ING")
             
-            # Leer usando la fila de encabezados encontrada
-            try:
-                df = pd.read_excel(BytesIO(file_content), engine='xlrd', header=header_row)
-            except:
-                df = pd.read_excel(BytesIO(file_content), engine='openpyxl', header=header_row)
+            # Usar la fila de encabezados encontrada sin volver a leer el archivo
+            df = excel_frame(cells, header_row)
             
             # Limpiar nombres de columnas
             df.columns = [str(col).strip() for col in df.columns]
@@ -644,217 +812,83 @@ class INGParser(BaseParser):
             df = df.dropna(how='all')
             df = df.reset_index(drop=True)
             
-            transactions = []
+            if df.empty:
+                return TransactionBatch('ing')
             
-            for _, row in df.iterrows():
-                try:
-                    # Buscar la columna de fecha
-                    date = None
-                    description = None
-                    amount = None
-                    balance = None
-                    category_info = []
-                    
-                    # Obtener fecha (primera columna o columna con "F. VALOR")
-                    for col in df.columns:
-                        col_lower = str(col).lower()
-                        if 'f. valor' in col_lower or 'fecha' in col_lower:
-                            date_val = row[col]
-                            if pd.notna(date_val):
-                                date = pd.to_datetime(date_val, errors='coerce')
-                                if pd.notna(date):
-                                    break
-                    
-                    # Si no encontramos fecha específica, probar la primera columna
-                    if pd.isna(date):
-                        date_val = row.iloc[0]
-                        if pd.notna(date_val):
-                            date = pd.to_datetime(date_val, errors='coerce')
-                    
-                    if pd.isna(date):
-                        continue
-                    
-                    # Buscar descripción
-                    for col in df.columns:
-                        col_lower = str(col).lower()
-                        if 'descripcion' in col_lower or 'descripción' in col_lower:
-                            description = str(row[col]).strip()
-                            if description != 'nan':
-                                break
-                    
-                    if not description or description == 'nan':
-                        description = ''
-                    
-                    # Añadir categoría y subcategoría a la descripción
-                    for col in df.columns:
-                        col_lower = str(col).lower()
-                        if 'categoria' in col_lower or 'categoría' in col_lower:
-                            cat = str(row[col]).strip()
-                            if cat != 'nan' and cat:
-                                category_info.append(cat)
-                        elif 'subcategoria' in col_lower or 'subcategoría' in col_lower:
-                            subcat = str(row[col]).strip()
-                            if subcat != 'nan' and subcat:
-                                category_info.append(subcat)
-                    
-                    # Combinar categorías con descripción
-                    if category_info:
-                        cat_str = ' - '.join(category_info)
-                        if description:
-                            description = f"{cat_str}: {description}"
-                        else:
-                            description = cat_str
-                    
-                    if not description:
-                        continue
-                    
-                    # Buscar importe
-                    for col in df.columns:
-                        col_lower = str(col).lower()
-                        if 'importe' in col_lower:
-                            amt = row[col]
-                            if pd.notna(amt) and amt != '':
-                                try:
-                                    amount = float(amt)
-                                    break
-                                except:
-                                    pass
-                    
-                    # Buscar saldo
-                    for col in df.columns:
-                        col_lower = str(col).lower()
-                        if 'saldo' in col_lower:
-                            bal = row[col]
-                            if pd.notna(bal) and bal != '':
-                                try:
-                                    balance = float(bal)
-                                    break
-                                except:
-                                    pass
-                    
-                    if amount is None:
-                        continue
-                    
-                    # Añadir comentario si existe
-                    extra_info = []
-                    for col in df.columns:
-                        col_lower = str(col).lower()
-                        if 'comentario' in col_lower:
-                            comment = str(row[col]).strip()
-                            if comment != 'nan' and comment:
-                                extra_info.append(comment)
-                    
-                    transaction_hash = self.generate_hash(date, description, amount, 'ing')
-                    
-                    transactions.append({
-                        'bank_type': 'ing',
-                        'date': date,
-                        'description': description,
-                        'amount': amount,
-                        'balance': balance,
-                        'extra_info': ' | '.join(extra_info) if extra_info else None,
-                        'transaction_hash': transaction_hash
-                    })
-                    
-                except (ValueError, IndexError, AttributeError) as e:
-                    print(f"Error procesando fila de ING: {e}")
-                    continue
+            # Fecha de la columna "F. VALOR"/"Fecha" o, si no se puede, de la primera columna
+            date_columns = find_columns(df, lambda name: 'f. valor' in name or 'fecha' in name)
+            dates = first_valid([to_dates(col) for col in date_columns + [df.iloc[:, 0]]], df.index)
+            
+            # Descripción
+            descriptions = first_valid([
+                present_text(col)
+                for col in find_columns(df, lambda name: 'descripcion' in name or 'descripción' in name)
+            ], df.index).fillna('')
             
-            return transactions
+            # Añadir categoría y subcategoría a la descripción
+            categories = join_columns(
+                find_columns(df, lambda name: 'categoria' in name or 'categoría' in name),
+                ' - ',
+                df.index
+            )
+            descriptions = (categories + ': ' + descriptions).where(descriptions != '', categories).where(
+                categories.notna(), descriptions
+            )
+            
+            # Importe y saldo
+            amounts = first_valid(
+                [to_float(col) for col in find_columns(df, lambda name: 'importe' in name)],
+                df.index
+            )
+            balances = first_valid(
+                [to_float(col) for col in find_columns(df, lambda name: 'saldo' in name)],
+                df.index
+            )
+            
+            # Comentario como información adicional
+            extra_info = join_columns(find_columns(df, lambda name: 'comentario' in name), ' | ', df.index)
+            
+            valid = dates.notna() & (descriptions != '') & amounts.notna()
+            
+            dates = dates[valid]
+            descriptions = descriptions[valid]
+            amounts = amounts[valid].astype(float).tolist()
+            hashes = self.generate_hashes(dates, descriptions, amounts, 'ing')
+            
+            return TransactionBatch(
+                'ing',
+                dates=py_datetimes(dates),
+                descriptions=descriptions.tolist(),
+                amounts=amounts,
+                balances=optional_floats(balances[valid]),
+                extra_infos=optional_texts(extra_info[valid]),
+                hashes=hashes
+            )
             
         except Exception as e:
             raise ValueError(f"Error al parsear archivo de ING: {str(e)}")
 
 
-def get_parser(bank_type: str) -> BaseParser:
-    """Parser para extractos de Imaginbank"""
-    
-    def parse(self, file_content: bytes) -> List[Dict[str, Any]]:
-        encoding = self.detect_encoding(file_content)
-        
-        df = pd.read_csv(
-            BytesIO(file_content),
-            encoding=encoding,
-            sep=';',
-            decimal=',',
-            thousands='.'
-        )
-        
-        transactions = []
-        
-        # Formato Imaginbank: Concepto;Fecha;Importe;Saldo
-        # Los valores tienen "EUR" al final
-        for _, row in df.iterrows():
-            try:
-                # En Imaginbank, la fecha está en la segunda columna
-                # Columnas: Concepto, Fecha, Importe, Saldo
-                description = str(row.iloc[0]).strip()
-                
-                # Fecha en la segunda posición
-                date_str = str(row.iloc[1]).strip()
-                date = pd.to_datetime(date_str, format='%d/%m/%Y', errors='coerce')
-                if pd.isna(date):
-                    continue
-                
-                # Importe en la tercera posición (con EUR al final)
-                amount_str = str(row.iloc[2]).strip()
-                # Quitar "EUR" si existe
-                amount_str = amount_str.replace('EUR', '').strip()
-                # Limpiar formato: -217,98 -> -217.98
-                amount_str = amount_str.replace('.', '').replace(',', '.')
-                try:
-                    amount = float(amount_str)
-                except:
-                    continue
-                
-                # Saldo en la cuarta posición (con EUR al final)
-                balance = None
-                if len(row) > 3:
-                    try:
-                        balance_str = str(row.iloc[3]).strip()
-                        balance_str = balance_str.replace('EUR', '').strip()
-                        balance_str = balance_str.replace('.', '').replace(',', '.')
-                        balance = float(balance_str)
-                    except:
-                        pass
-                
-                transaction = {
-                    'bank_type': 'imaginbank',
-                    'date': date.to_pydatetime(),
-                    'description': description,
-                    'amount': amount,
-                    'balance': balance,
-                    'reference': None,
-                    'extra_info': None
-                }
-                
-                transaction['transaction_hash'] = self.generate_hash(
-                    transaction['date'],
-                    transaction['description'],
-                    transaction['amount'],
-                    transaction['bank_type']
-                )
-                
-                transactions.append(transaction)
-            except Exception as e:
-                print(f"Error parsing row: {e}")
-                continue
-        
-        return transactions
+# Clase del parser de cada tipo de banco
+PARSER_CLASSES: Dict[str, Type[BaseParser]] = {
+    'kutxabank_account': KutxabankAccountParser,
+    'kutxabank_card': KutxabankCardParser,
+    'openbank': OpenbankParser,
+    'imaginbank': ImaginbankParser,
+    'bbva': BBVAParser,
+    'ing': INGParser
+}
+
+# Parsers ya creados en este proceso (no guardan estado entre archivos)
+_parsers: Dict[str, BaseParser] = {}
+
 
 def get_parser(bank_type: str) -> BaseParser:
-    """Factory para obtener el parser apropiado según el tipo de banco"""
-    parsers = {
-        'kutxabank_account': KutxabankAccountParser(),
-        'kutxabank_card': KutxabankCardParser(),
-        'openbank': OpenbankParser(),
-        'imaginbank': ImaginbankParser(),
-        'bbva': BBVAParser(),
-        'ing': INGParser()
-    }
-    
-    parser = parsers.get(bank_type)
-    if not parser:
-        raise ValueError(f"Tipo de banco no soportado: {bank_type}")
-    
+    """Parser del tipo de banco, que se crea la primera vez que se pide en cada proceso"""
+    parser = _parsers.get(bank_type)
+    if parser is None:
+        parser_class = PARSER_CLASSES.get(bank_type)
+        if not parser_class:
+            raise ValueError(f"Tipo de banco no soportado: {bank_type}")
+        parser = _parsers[bank_type] = parser_class()
     return parser
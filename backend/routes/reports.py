@@ -1,5 +1,5 @@
 from fastapi import APIRouter, Depends, Query
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, joinedload
 from sqlalchemy import func, extract, case
 from database import get_db
 from models import Transaction as TransactionModel, Category as CategoryModel, User
@@ -100,7 +100,11 @@ def get_top_expenses(
     current_user: User = Depends(get_current_active_user)
 ):
     """Obtener los gastos más grandes"""
-    query = db.query(TransactionModel).filter(
+    # La categoría y subcategoría de la respuesta se cargan en la misma consulta
+    query = db.query(TransactionModel).options(
+        joinedload(TransactionModel.category),
+        joinedload(TransactionModel.subcategory)
+    ).filter(
         TransactionModel.amount < 0,
         TransactionModel.user_id == current_user.id
     )
@@ -1,40 +1,75 @@
-from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File, Response
 from fastapi.responses import StreamingResponse
-from sqlalchemy.orm import Session
-from typing import List, Optional
-from database import get_db
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session, joinedload
+from typing import List, Optional, Tuple
+from database import get_db, SessionLocal
 from models import Transaction as TransactionModel, StoreMapping, User, Category, Subcategory
 from schemas import Transaction, TransactionUpdate
 from datetime import datetime
 from pydantic import BaseModel
 from auth import get_current_active_user
+from ingest import insert_rows, stage_records
+from parsed_transactions import ParsedTransaction
+import search
+import base64
 import csv
 import io
 import hashlib
 
 router = APIRouter()
 
+# Cabecera con el cursor de la página siguiente del listado de transacciones
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Columnas del CSV de exportación y filas que se envían en cada bloque
+EXPORT_COLUMNS = [
+    'id',
+    'date',
+    'description',
+    'amount',
+    'bank_type',
+    'balance',
+    'reference',
+    'extra_info',
+    'category',
+    'subcategory',
+    'transaction_hash',
+    'created_at'
+]
+EXPORT_CHUNK_SIZE = 1000
+
 class BulkCategorizeRequest(BaseModel):
     transaction_ids: List[int]
     category_id: Optional[int] = None
     subcategory_id: Optional[int] = None
 
-@router.get("/", response_model=List[Transaction])
-def get_transactions(
-    skip: int = 0,
-    limit: int = 100,
+def encode_cursor(transaction: TransactionModel) -> str:
+    """Cursor opaco que apunta justo detrás de una transacción en el orden (fecha, id) descendente"""
+    key = f"{transaction.date.isoformat()}|{transaction.id}"
+    return base64.urlsafe_b64encode(key.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    """(fecha, id) de un cursor generado por encode_cursor"""
+    try:
+        date_str, id_str = base64.urlsafe_b64decode(cursor.encode()).decode().split('|')
+        return datetime.fromisoformat(date_str), int(id_str)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Cursor de paginación inválido")
+
+
+def filter_transactions(
+    query,
+    db: Session,
     bank_type: Optional[str] = None,
-    category_id: Optional[str] = None,  # Cambiado a str para permitir "null"
+    category_id: Optional[str] = None,
     transaction_type: Optional[str] = None,
     description: Optional[str] = None,
     start_date: Optional[str] = None,
-    end_date: Optional[str] = None,
-    db: Session = Depends(get_db),
-    current_user: User = Depends(get_current_active_user)
+    end_date: Optional[str] = None
 ):
-    """Obtener lista de transacciones con filtros opcionales"""
-    query = db.query(TransactionModel).filter(TransactionModel.user_id == current_user.id)
-    
+    """Aplicar a la consulta los filtros del listado de transacciones"""
     if bank_type:
         query = query.filter(TransactionModel.bank_type == bank_type)
     
@@ -52,7 +87,8 @@ def get_transactions(
             query = query.filter(TransactionModel.amount > 0)
     
     if description:
-        query = query.filter(TransactionModel.description.ilike(f'%{description}%'))
+        # Sin distinguir mayúsculas ni acentos, con el índice de search
+        query = query.filter(search.description_filter(db.get_bind().dialect.name, description))
     
     if start_date:
         start = datetime.fromisoformat(start_date)
@@ -62,71 +98,164 @@ def get_transactions(
         end = datetime.fromisoformat(end_date)
         query = query.filter(TransactionModel.date <= end)
     
-    transactions = query.order_by(TransactionModel.date.desc()).offset(skip).limit(limit).all()
+    return query
+
+
+@router.get("/", response_model=List[Transaction])
+def get_transactions(
+    response: Response,
+    skip: int = 0,
+    limit: int = 100,
+    cursor: Optional[str] = None,
+    bank_type: Optional[str] = None,
+    category_id: Optional[str] = None,  # Cambiado a str para permitir "null"
+    transaction_type: Optional[str] = None,
+    description: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """
+    Obtener lista de transacciones con filtros opcionales.
+
+    Se pagina con skip/limit o con cursor: cada página devuelve en la cabecera
+    X-Next-Cursor el cursor de la siguiente (salvo la última). Con cursor la
+    consulta continúa desde la última transacción vista en vez de recorrer y
+    descartar las anteriores, así que las páginas profundas cuestan lo mismo
+    que la primera.
+    """
+    # La categoría y subcategoría de la respuesta se cargan en la misma consulta
+    query = db.query(TransactionModel).options(
+        joinedload(TransactionModel.category),
+        joinedload(TransactionModel.subcategory)
+    ).filter(TransactionModel.user_id == current_user.id)
+    
+    query = filter_transactions(
+        query, db, bank_type, category_id, transaction_type, description, start_date, end_date
+    )
+    
+    # El id desempata las transacciones de la misma fecha para que el orden sea estable
+    query = query.order_by(TransactionModel.date.desc(), TransactionModel.id.desc())
+    if cursor:
+        cursor_date, cursor_id = decode_cursor(cursor)
+        query = query.filter(
+            tuple_(TransactionModel.date, TransactionModel.id) < (cursor_date, cursor_id)
+        )
+    else:
+        query = query.offset(skip)
+
+    # Una fila de más indica si hay página siguiente
+    transactions = query.limit(limit + 1).all()
+    if len(transactions) > limit:
+        transactions = transactions[:limit]
+        if transactions:
+            response.headers[NEXT_CURSOR_HEADER] = encode_cursor(transactions[-1])
     return transactions
 
 
+def export_rows(user_id: int):
+    """
+    Generador con el CSV de las transacciones del usuario, por bloques de
+    EXPORT_CHUNK_SIZE filas.
+
+    Lee las filas con un cursor del servidor (yield_per) y los nombres de
+    categoría y subcategoría en la misma consulta, así que la memoria no
+    depende del número de transacciones. Usa su propia sesión porque se
+    consume mientras se envía la respuesta.
+    """
+    db = SessionLocal()
+    try:
+        query = db.query(
+            TransactionModel.id,
+            TransactionModel.date,
+            TransactionModel.description,
+            TransactionModel.amount,
+            TransactionModel.bank_type,
+            TransactionModel.balance,
+            TransactionModel.reference,
+            TransactionModel.extra_info,
+            Category.name,
+            Subcategory.name,
+            TransactionModel.transaction_hash,
+            TransactionModel.created_at
+        ).outerjoin(
+            Category, TransactionModel.category_id == Category.id
+        ).outerjoin(
+            Subcategory, TransactionModel.subcategory_id == Subcategory.id
+        ).filter(
+            TransactionModel.user_id == user_id
+        ).order_by(
+            TransactionModel.date.desc(), TransactionModel.id.desc()
+        ).yield_per(EXPORT_CHUNK_SIZE)
+
+        output = io.StringIO()
+        writer = csv.writer(output)
+
+        # Escribir encabezados
+        writer.writerow(EXPORT_COLUMNS)
+
+        # Escribir datos y enviarlos cada EXPORT_CHUNK_SIZE filas
+        for count, (transaction_id, date, description, amount, bank_type, balance, reference,
+                    extra_info, category_name, subcategory_name, transaction_hash,
+                    created_at) in enumerate(query, start=1):
+            writer.writerow([
+                transaction_id,
+                date.isoformat() if date else '',
+                description,
+                amount,
+                bank_type,
+                balance if balance else '',
+                reference if reference else '',
+                extra_info if extra_info else '',
+                category_name or '',
+                subcategory_name or '',
+                transaction_hash,
+                created_at.isoformat() if created_at else ''
+            ])
+            if count % EXPORT_CHUNK_SIZE == 0:
+                yield output.getvalue()
+                output.seek(0)
+                output.truncate()
+
+        yield output.getvalue()
+    finally:
+        db.close()
+
+
+@router.get("/count")
+def get_transactions_count(
+    bank_type: Optional[str] = None,
+    category_id: Optional[str] = None,
+    transaction_type: Optional[str] = None,
+    description: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Obtener el número de transacciones que cumplen los filtros del listado"""
+    query = db.query(TransactionModel).filter(TransactionModel.user_id == current_user.id)
+    count = filter_transactions(
+        query, db, bank_type, category_id, transaction_type, description, start_date, end_date
+    ).count()
+    return {"count": count}
+
 @router.get("/export")
 def export_transactions(
-    db: Session = Depends(get_db),
     current_user: User = Depends(get_current_active_user)
 ):
     """
     Exporta todas las transacciones del usuario en formato CSV
+
+    El archivo se genera mientras se descarga, sin cargarlo entero en memoria.
     """
-    # Obtener todas las transacciones del usuario con sus relaciones
-    transactions = db.query(TransactionModel).filter(
-        TransactionModel.user_id == current_user.id
-    ).order_by(TransactionModel.date.desc()).all()
-    
-    # Crear CSV en memoria
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Escribir encabezados
-    writer.writerow([
-        'id',
-        'date',
-        'description',
-        'amount',
-        'bank_type',
-        'balance',
-        'reference',
-        'extra_info',
-        'category',
-        'subcategory',
-        'transaction_hash',
-        'created_at'
-    ])
-    
-    # Escribir datos
-    for transaction in transactions:
-        category_name = transaction.category.name if transaction.category else ''
-        subcategory_name = transaction.subcategory.name if transaction.subcategory else ''
-        
-        writer.writerow([
-            transaction.id,
-            transaction.date.isoformat() if transaction.date else '',
-            transaction.description,
-            transaction.amount,
-            transaction.bank_type,
-            transaction.balance if transaction.balance else '',
-            transaction.reference if transaction.reference else '',
-            transaction.extra_info if transaction.extra_info else '',
-            category_name,
-            subcategory_name,
-            transaction.transaction_hash,
-            transaction.created_at.isoformat() if transaction.created_at else ''
-        ])
-    
-    # Preparar respuesta
-    output.seek(0)
     headers = {
         'Content-Disposition': f'attachment; filename="transacciones_{datetime.now().strftime("%Y%m%d_%H%M%S")}.csv"'
     }
     
     return StreamingResponse(
-        iter([output.getvalue()]),
+        export_rows(current_user.id),
         media_type="text/csv",
         headers=headers
     )
@@ -153,10 +282,10 @@ async def import_transactions(
         # Parsear CSV
         csv_reader = csv.DictReader(io.StringIO(csv_text))
         
-        imported_count = 0
-        duplicate_count = 0
         error_count = 0
         errors = []
+        records = []
+        categories = []
         
         for row_num, row in enumerate(csv_reader, start=2):  # start=2 porque la fila 1 son los headers
             try:
@@ -190,16 +319,6 @@ async def import_transactions(
                     hash_string = f"{date.date()}_{row['description']}_{amount}_{row['bank_type']}"
                     transaction_hash = hashlib.md5(hash_string.encode()).hexdigest()
                 
-                # Verificar si ya existe
-                existing = db.query(TransactionModel).filter(
-                    TransactionModel.transaction_hash == transaction_hash,
-                    TransactionModel.user_id == current_user.id
-                ).first()
-                
-                if existing:
-                    duplicate_count += 1
-                    continue
-                
                 # Buscar categoría si existe en el CSV
                 category_id = None
                 subcategory_id = None
@@ -231,30 +350,28 @@ async def import_transactions(
                     except:
                         pass
                 
-                # Crear transacción
-                new_transaction = TransactionModel(
+                # Preparar transacción para la inserción masiva
+                records.append(ParsedTransaction(
+                    bank_type=row['bank_type'],
                     date=date,
                     description=row['description'],
                     amount=amount,
-                    bank_type=row['bank_type'],
                     balance=balance,
                     reference=row.get('reference', ''),
                     extra_info=row.get('extra_info', ''),
-                    category_id=category_id,
-                    subcategory_id=subcategory_id,
-                    transaction_hash=transaction_hash,
-                    user_id=current_user.id
-                )
-                
-                db.add(new_transaction)
-                imported_count += 1
+                    transaction_hash=transaction_hash
+                ))
+                categories.append((category_id, subcategory_id))
                 
             except Exception as e:
                 errors.append(f"Fila {row_num}: {str(e)}")
                 error_count += 1
                 continue
         
-        # Guardar cambios
+        # Insertar y descartar duplicados en la base de datos
+        imported_count, duplicate_count = insert_rows(
+            db, stage_records(records, current_user.id, categories)
+        )
         db.commit()
         
         return {
@@ -276,7 +393,10 @@ def get_transaction(
     current_user: User = Depends(get_current_active_user)
 ):
     """Obtener una transacción específica"""
-    transaction = db.query(TransactionModel).filter(
+    transaction = db.query(TransactionModel).options(
+        joinedload(TransactionModel.category),
+        joinedload(TransactionModel.subcategory)
+    ).filter(
         TransactionModel.id == transaction_id,
         TransactionModel.user_id == current_user.id
     ).first()
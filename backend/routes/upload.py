@@ -1,18 +1,20 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Form, Query
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
-from sqlalchemy.exc import IntegrityError
 from database import get_db
-from models import Transaction as TransactionModel, StoreMapping, User
-from schemas import UploadResponse
-from parsers import get_parser
+from models import User, ImportJob as ImportJobModel
+from schemas import ImportJob
 from bank_detector import BankDetector
+from starlette.concurrency import run_in_threadpool
+from import_jobs import create_import_job, run_import_job, job_events, job_progress
 from typing import Optional, List
 from auth import get_current_active_user
 
 router = APIRouter()
 
-@router.post("/", response_model=UploadResponse)
+@router.post("/", response_model=ImportJob, status_code=202)
 async def upload_csv(
+    background_tasks: BackgroundTasks,
     files: List[UploadFile] = File(...),
     bank_type: Optional[str] = Form(None),
     db: Session = Depends(get_db),
@@ -21,6 +23,9 @@ async def upload_csv(
     """
     Subir uno o varios archivos de extracto bancario (CSV, XLS, HTML)
     
+    Crea un trabajo de importación y lo procesa en segundo plano; el progreso
+    se consulta en /api/upload/jobs/{job_id}.
+    
     Si no se especifica bank_type, se intentará detectar automáticamente.
     
     Tipos de banco soportados:
@@ -28,133 +33,68 @@ async def upload_csv(
     - kutxabank_card
     - openbank
     - imaginbank
+    - bbva
+    - ing
     """
     try:
-        # Estadísticas totales
-        total_rows = 0
-        imported = 0
-        duplicates = 0
-        errors = 0
-        processed_files = 0
-        file_details = []
-        
-        # Procesar cada archivo
-        for file in files:
-            try:
-                # Leer el contenido del archivo
-                content = await file.read()
-                
-                # Detectar o usar el tipo de banco proporcionado
-                detected_bank_type = bank_type
-                
-                if not detected_bank_type:
-                    # Intentar detectar automáticamente
-                    detected_bank_type = BankDetector.detect_bank_type(content, file.filename)
-                    
-                    if not detected_bank_type:
-                        file_details.append(f"❌ {file.filename}: No se pudo detectar el banco")
-                        errors += 1
-                        continue
-                
-                # Obtener el parser apropiado
-                try:
-                    parser = get_parser(detected_bank_type)
-                except ValueError as e:
-                    file_details.append(f"❌ {file.filename}: {str(e)}")
-                    errors += 1
-                    continue
-                
-                # Parsear el archivo
-                transactions = parser.parse(content)
-                
-                if not transactions:
-                    file_details.append(f"⚠️ {file.filename}: Sin transacciones")
-                    continue
-                
-                # Estadísticas por archivo
-                file_imported = 0
-                file_duplicates = 0
-                file_errors = 0
-                
-                total_rows += len(transactions)
-                
-                # Insertar transacciones
-                for trans_data in transactions:
-                    try:
-                        # Buscar mapeo de tienda para auto-categorización del usuario
-                        store_name = trans_data['description'].split()[0] if trans_data['description'] else ""
-                        store_mapping = db.query(StoreMapping).filter(
-                            StoreMapping.store_name == store_name,
-                            StoreMapping.user_id == current_user.id
-                        ).first()
-                        
-                        if store_mapping:
-                            trans_data['category_id'] = store_mapping.category_id
-                            trans_data['subcategory_id'] = store_mapping.subcategory_id
-                        
-                        # Añadir el user_id a la transacción
-                        trans_data['user_id'] = current_user.id
-                        
-                        # Crear transacción
-                        transaction = TransactionModel(**trans_data)
-                        db.add(transaction)
-                        db.commit()
-                        imported += 1
-                        file_imported += 1
-                        
-                    except IntegrityError:
-                        # Duplicado detectado por transaction_hash único
-                        db.rollback()
-                        duplicates += 1
-                        file_duplicates += 1
-                    except Exception as e:
-                        db.rollback()
-                        errors += 1
-                        file_errors += 1
-                        print(f"Error al insertar transacción: {e}")
-                
-                processed_files += 1
-                bank_name = dict(BankDetector.get_available_banks()).get(
-                    detected_bank_type, detected_bank_type
-                )
-                file_details.append(
-                    f"✓ {file.filename} ({bank_name}): {file_imported} nuevas, {file_duplicates} duplicadas"
-                )
-                
-            except Exception as e:
-                file_details.append(f"❌ {file.filename}: Error - {str(e)}")
-                errors += 1
-                continue
-        
-        # Construir mensaje de resumen
-        if processed_files == 0:
-            return UploadResponse(
-                success=False,
-                total_rows=total_rows,
-                imported=imported,
-                duplicates=duplicates,
-                errors=errors,
-                message="No se pudo procesar ningún archivo. " + "; ".join(file_details)
-            )
-        
-        summary = f"Procesados {processed_files} de {len(files)} archivo(s): {imported} nuevas, {duplicates} duplicadas, {errors} errores"
-        if file_details:
-            summary += "\n\n" + "\n".join(file_details)
+        # Leer los archivos antes de responder (se cierran al terminar la petición)
+        uploaded = [(file.filename, await file.read()) for file in files]
         
-        return UploadResponse(
-            success=True,
-            total_rows=total_rows,
-            imported=imported,
-            duplicates=duplicates,
-            errors=errors,
-            message=summary
+        job = ImportJob.model_validate(
+            create_import_job(db, current_user.id, [filename for filename, _ in uploaded], bank_type)
         )
+        # Devolver la conexión al pool: la sesión de la petición no se cierra
+        # hasta que termina la tarea en segundo plano, que usa la suya propia
+        db.close()
+        background_tasks.add_task(run_import_job, job.id, uploaded)
+        
+        return job
         
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error al procesar los archivos: {str(e)}")
 
+@router.get("/jobs/{job_id}", response_model=ImportJob)
+def get_import_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Obtener el progreso de un trabajo de importación"""
+    job = db.query(ImportJobModel).filter(
+        ImportJobModel.id == job_id,
+        ImportJobModel.user_id == current_user.id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo de importación no encontrado")
+    return job_progress(job)
+
+@router.get("/jobs/{job_id}/events")
+def stream_import_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_active_user)
+):
+    """Recibir el progreso de un trabajo de importación como Server-Sent Events"""
+    job = db.query(ImportJobModel).filter(
+        ImportJobModel.id == job_id,
+        ImportJobModel.user_id == current_user.id
+    ).first()
+    if not job:
+        raise HTTPException(status_code=404, detail="Trabajo de importación no encontrado")
+    
+    # Devolver la conexión al pool: job_events usa sesiones propias y, si no,
+    # la de la petición quedaría ocupada mientras dure el stream
+    db.close()
+    
+    return StreamingResponse(
+        job_events(job_id),
+        media_type="text/event-stream",
+        headers={
+            'Cache-Control': 'no-cache',
+            'X-Accel-Buffering': 'no'  # Evitar que nginx acumule los eventos
+        }
+    )
+
 @router.get("/bank-types")
 def get_bank_types():
     """Obtener lista de tipos de banco soportados"""
@@ -171,14 +111,18 @@ async def detect_bank(file: UploadFile = File(...)):
     """Detectar automáticamente el tipo de banco del archivo"""
     try:
         content = await file.read()
-        detected_type = BankDetector.detect_bank_type(content, file.filename)
+        # La detección solo lee el inicio del archivo: basta un hilo, y así no
+        # espera detrás de los archivos que se están parseando en el pool
+        detected_type, confidence = await run_in_threadpool(
+            BankDetector.detect_with_confidence, content, file.filename
+        )
         
         if detected_type:
-            banks = {bank['value']: bank['label'] for bank in BankDetector.get_available_banks()}
             return {
                 "success": True,
                 "bank_type": detected_type,
-                "bank_name": banks.get(detected_type, detected_type)
+                "bank_name": BankDetector.get_bank_name(detected_type),
+                "confidence": round(confidence, 2)
             }
         else:
             return {
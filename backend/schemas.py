@@ -130,13 +130,37 @@ class Transaction(TransactionBase):
         from_attributes = True
 
 # Upload Schemas
-class UploadResponse(BaseModel):
-    success: bool
+class ImportJobFile(BaseModel):
+    id: int
+    filename: str
+    status: str
+    bank_type: Optional[str] = None
+    total_rows: int
+    imported: int
+    duplicates: int
+    message: Optional[str] = None
+    
+    class Config:
+        from_attributes = True
+
+class ImportJob(BaseModel):
+    id: int
+    status: str
+    bank_type: Optional[str] = None
+    total_files: int
+    processed_files: int
     total_rows: int
     imported: int
     duplicates: int
     errors: int
-    message: str
+    success: Optional[bool] = None
+    message: Optional[str] = None
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    files: List[ImportJobFile] = []
+    
+    class Config:
+        from_attributes = True
 
 # Report Schemas
 class MonthlyReport(BaseModel):
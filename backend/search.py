@@ -0,0 +1,164 @@
+"""
+Búsqueda de transacciones por descripción, sin distinguir mayúsculas ni
+acentos y con un índice que evita recorrer todas las transacciones.
+
+- SQLite: tabla FTS5 con el tokenizador trigram (búsqueda de subcadenas) que
+  guarda la descripción normalizada. Las importaciones la rellenan en bloque
+  con la descripción ya normalizada en Python (index_staged); los triggers
+  la mantienen al borrar una transacción o cambiar su descripción.
+- PostgreSQL: índice GIN pg_trgm sobre la descripción sin acentos (unaccent).
+
+Las búsquedas de menos de 3 caracteres (no tienen trigramas) y las bases de
+datos sin el índice usan ILIKE como antes.
+"""
+from sqlalchemy import String, func, select, table, column, literal_column, text
+from sqlalchemy.engine import Connection, Engine
+from models import Transaction as TransactionModel
+
+# Longitud mínima de la búsqueda para usar el índice de trigramas
+MIN_INDEXED_LENGTH = 3
+
+# Tabla FTS5 (SQLite) cuyo rowid es el id de la transacción
+SEARCH_TABLE = 'transactions_search'
+
+# Letras que se igualan al buscar en SQLite (la ñ cuenta como n, como hace
+# unaccent). En el trigger de actualización cada una es un replace() anidado y
+# el parser de SQLite admite pocos niveles: solo las de las descripciones en
+# castellano, catalán y euskera
+ACCENT_FOLDING = {
+    'á': 'a', 'à': 'a', 'é': 'e', 'è': 'e', 'í': 'i', 'ï': 'i',
+    'ó': 'o', 'ò': 'o', 'ú': 'u', 'ü': 'u', 'ñ': 'n', 'ç': 'c',
+}
+ACCENT_FOLDING.update({accented.upper(): plain for accented, plain in ACCENT_FOLDING.items()})
+
+_FOLD_TABLE = str.maketrans(ACCENT_FOLDING)
+
+# Si la base de datos tiene el índice de búsqueda (lo decide setup al arrancar)
+_indexed = False
+
+
+def normalize(value: str) -> str:
+    """Texto en minúsculas y sin acentos, igual que se guarda en el índice"""
+    return value.lower().translate(_FOLD_TABLE)
+
+
+def _sqlite_fold(expression: str) -> str:
+    """Expresión SQL de SQLite equivalente a normalize() (su lower() solo cambia ASCII)"""
+    folded = f"lower({expression})"
+    for accented, plain in ACCENT_FOLDING.items():
+        folded = f"replace({folded}, '{accented}', '{plain}')"
+    return folded
+
+
+def setup(engine: Engine):
+    """Crear (si faltan) el índice de búsqueda y lo que necesita para mantenerse al día"""
+    global _indexed
+    try:
+        with engine.begin() as conn:
+            dialect = conn.dialect.name
+            if dialect == 'sqlite':
+                _setup_sqlite(conn)
+            elif dialect == 'postgresql':
+                _setup_postgresql(conn)
+            else:
+                return
+        _indexed = True
+    except Exception as e:
+        print(f"⚠️  Índice de búsqueda no disponible, se usará ILIKE: {e}")
+
+
+def _setup_sqlite(conn: Connection):
+    exists = conn.execute(
+        text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+        {'name': SEARCH_TABLE}
+    ).first()
+
+    if not exists:
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5(description, tokenize = 'trigram')"
+        ))
+
+    # Las inserciones se indexan en bloque desde la importación (index_staged):
+    # un trigger por fila con la cadena de replace() la hacía el doble de lenta
+    conn.execute(text("DROP TRIGGER IF EXISTS transactions_search_insert"))
+    index_missing(conn)
+
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS transactions_search_delete AFTER DELETE ON transactions
+        BEGIN
+            DELETE FROM {SEARCH_TABLE} WHERE rowid = old.id;
+        END
+    """))
+    conn.execute(text(f"""
+        CREATE TRIGGER IF NOT EXISTS transactions_search_update AFTER UPDATE OF description ON transactions
+        BEGIN
+            UPDATE {SEARCH_TABLE} SET description = {_sqlite_fold('new.description')} WHERE rowid = new.id;
+        END
+    """))
+
+
+def index_missing(conn: Connection):
+    """
+    Indexar (SQLite) las transacciones posteriores a la última indexada: las
+    que ya existían al crear el índice o se insertaron sin pasar por la
+    importación
+    """
+    conn.execute(text(
+        f"INSERT INTO {SEARCH_TABLE} (rowid, description) "
+        f"SELECT id, {_sqlite_fold('description')} FROM transactions "
+        f"WHERE id > (SELECT coalesce(max(rowid), 0) FROM {SEARCH_TABLE})"
+    ))
+
+
+def index_staged(conn: Connection, staging_table: str, first_id: int, last_id: int):
+    """
+    Indexar (SQLite) las transacciones con id entre first_id y last_id recién
+    insertadas desde la tabla temporal de la importación, que guarda la
+    descripción ya normalizada en la columna search_description
+    """
+    if not _indexed or conn.dialect.name != 'sqlite':
+        return
+    # GROUP BY: un archivo puede repetir una transacción (mismo hash)
+    conn.execute(text(
+        f"INSERT INTO {SEARCH_TABLE} (rowid, description) "
+        f"SELECT t.id, min(s.search_description) FROM transactions t "
+        f"JOIN {staging_table} s ON s.user_id = t.user_id AND s.transaction_hash = t.transaction_hash "
+        f"WHERE t.id BETWEEN :first_id AND :last_id GROUP BY t.id"
+    ), {'first_id': first_id, 'last_id': last_id})
+
+
+def _setup_postgresql(conn: Connection):
+    conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    conn.execute(text("CREATE EXTENSION IF NOT EXISTS unaccent"))
+    # unaccent() no es IMMUTABLE y no puede usarse en un índice; esta envoltura sí
+    conn.execute(text("""
+        CREATE OR REPLACE FUNCTION f_unaccent(text) RETURNS text AS
+        $$ SELECT public.unaccent('public.unaccent', $1) $$
+        LANGUAGE sql IMMUTABLE PARALLEL SAFE STRICT
+    """))
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_transactions_description_trgm ON transactions "
+        "USING gin (f_unaccent(lower(description)) gin_trgm_ops)"
+    ))
+
+
+def description_filter(dialect: str, query: str):
+    """Condición de SQLAlchemy: la descripción contiene el texto buscado"""
+    normalized = normalize(query)
+    if not _indexed or len(normalized) < MIN_INDEXED_LENGTH:
+        return TransactionModel.description.ilike(f'%{query}%')
+
+    if dialect == 'sqlite':
+        # Una frase de FTS5 con el tokenizador trigram busca la subcadena
+        phrase = '"' + normalized.replace('"', '""') + '"'
+        search_table = table(SEARCH_TABLE, column('rowid'))
+        matches = select(literal_column('rowid')).select_from(search_table).where(
+            literal_column(SEARCH_TABLE).op('MATCH')(phrase)
+        )
+        return TransactionModel.id.in_(matches)
+
+    # PostgreSQL: el mismo LIKE que el índice pg_trgm puede resolver, con la
+    # búsqueda normalizada por la misma f_unaccent que la descripción indexada
+    escaped = query.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+    pattern = '%' + func.f_unaccent(func.lower(escaped), type_=String) + '%'
+    return func.f_unaccent(func.lower(TransactionModel.description)).like(pattern)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Script para comprobar que generate_hashes (todas las transacciones de un
+archivo a la vez) devuelve exactamente los mismos hashes que generate_hash
+fila a fila. Si cambiara un solo carácter, las transacciones ya importadas
+dejarían de detectarse como duplicadas.
+"""
+
+import sys
+from datetime import datetime
+
+import pandas as pd
+
+from parsers import BaseParser
+
+# (fecha, descripción, importe) con los valores cuyo texto es más fácil que
+# difiera entre el f-string de generate_hash y las operaciones de columna
+CASES = [
+    (datetime(2024, 1, 15), 'COMPRA MERCADONA', -23.45),
+    (datetime(2024, 1, 15), 'Suma 0.1 + 0.2', 0.1 + 0.2),
+    (datetime(2024, 1, 16), 'Cero negativo', -0.0),
+    (datetime(2024, 1, 16), 'Cero', 0.0),
+    (datetime(2024, 1, 17), 'Un tercio', 1 / 3),
+    (datetime(2024, 1, 17), 'Entero grande', 1e16),
+    (datetime(2024, 1, 17), 'Muy pequeño', 5e-324),
+    (datetime(2024, 1, 18, 9, 30, 15, 123456), 'Con microsegundos', 10.0),
+    (datetime(2024, 1, 18, 9, 30, 15, 1), 'Un microsegundo', 10.0),
+    (datetime(2024, 2, 29, 23, 59, 59, 999999), 'Fin de día bisiesto', 10.0),
+    (pd.Timestamp('2024-03-01 10:00:00.000000001'), 'Con nanosegundos', 10.0),
+    (datetime(2024, 3, 2), None, 5.0),
+    (datetime(2024, 3, 2), '', 5.0),
+    (datetime(2024, 3, 3), 'Café Ñandú: àéíóú ÀÉÍÓÚ ü ç', -7.5),
+    (datetime(2024, 3, 3), 'Tab\tcomillas "dobles" y \'simples\'', -7.5),
+    (datetime(2024, 3, 4), 'Emoji 🛒', 1234567.89),
+]
+
+
+def check_hashes() -> bool:
+    print("=" * 60)
+    print("PROBANDO HASHES EN BLOQUE FRENTE A FILA A FILA")
+    print("=" * 60)
+
+    parser = BaseParser()
+    dates, descriptions, amounts = zip(*CASES)
+    bank_type = 'imaginbank'
+
+    try:
+        batch = parser.generate_hashes(pd.Series(dates), pd.Series(descriptions), list(amounts), bank_type)
+    except Exception as e:
+        print(f"\n❌ Error al generar los hashes en bloque: {e}")
+        return False
+
+    ok = len(batch) == len(CASES)
+    if not ok:
+        print(f"\n❌ {len(batch)} hashes para {len(CASES)} transacciones")
+
+    for (date, description, amount), batch_hash in zip(CASES, batch):
+        row_hash = parser.generate_hash(date, description, amount, bank_type)
+        if batch_hash == row_hash:
+            print(f"✓ {date} | {description!r} | {amount!r}")
+        else:
+            ok = False
+            print(f"❌ {date} | {description!r} | {amount!r}: {batch_hash} != {row_hash}")
+
+    if ok:
+        print(f"\n✅ Los {len(CASES)} hashes coinciden")
+    return ok
+
+
+def test_hashes():
+    assert check_hashes()
+
+
+if __name__ == '__main__':
+    if check_hashes():
+        print("\n🎉 Todos los tests pasaron correctamente!")
+        sys.exit(0)
+    else:
+        print("\n⚠️  Algunos tests fallaron")
+        sys.exit(1)
@@ -29,12 +29,12 @@ def test_bbva():
         if transactions:
             print("\n📋 Primera transacción:")
             first = transactions[0]
-            for key, value in first.items():
+            for key, value in first.as_dict().items():
                 print(f"  {key}: {value}")
             
             print("\n📋 Todas las transacciones:")
             for i, trans in enumerate(transactions, 1):
-                print(f"\n  {i}. {trans['date'].strftime('%Y-%m-%d')} | {trans['description'][:50]} | {trans['amount']} € | Saldo: {trans.get('balance', 'N/A')}")
+                print(f"\n  {i}. {trans.date.strftime('%Y-%m-%d')} | {trans.description[:50]} | {trans.amount} € | Saldo: {trans.balance}")
         
         print(f"\n✅ BBVA: Test completado exitosamente")
         return True
@@ -67,13 +67,13 @@ def test_ing():
         if transactions:
             print("\n📋 Primera transacción:")
             first = transactions[0]
-            for key, value in first.items():
+            for key, value in first.as_dict().items():
                 print(f"  {key}: {value}")
             
             print("\n📋 Todas las transacciones:")
             for i, trans in enumerate(transactions, 1):
-                extra = f" | {trans['extra_info']}" if trans.get('extra_info') else ''
-                print(f"\n  {i}. {trans['date'].strftime('%Y-%m-%d')} | {trans['description'][:50]} | {trans['amount']} € | Saldo: {trans.get('balance', 'N/A')}{extra}")
+                extra = f" | {trans.extra_info}" if trans.extra_info else ''
+                print(f"\n  {i}. {trans.date.strftime('%Y-%m-%d')} | {trans.description[:50]} | {trans.amount} € | Saldo: {trans.balance}{extra}")
         
         print(f"\n✅ ING: Test completado exitosamente")
         return True
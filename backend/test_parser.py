@@ -14,7 +14,7 @@ transactions = parser.parse(content)
 print(f'Total de transacciones parseadas: {len(transactions)}')
 print(f'\nTransacciones parseadas:')
 for i, trans in enumerate(transactions, 1):
-    print(f"{i}. {trans['date'].strftime('%d/%m/%Y')} - {trans['description'][:40]} - {trans['amount']}")
+    print(f"{i}. {trans.date.strftime('%d/%m/%Y')} - {trans.description[:40]} - {trans.amount}")
 
 print(f'\n=== RESUMEN ===')
 print(f'Esperadas: 38')
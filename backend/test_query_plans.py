@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+Script para comprobar las consultas de transacciones e informes: que usan
+índices en lugar de recorrer la tabla entera y que cada petición ejecuta un
+número acotado de sentencias (sin una consulta por fila).
+
+Crea una base de datos SQLite temporal con transacciones de varios usuarios,
+llama a cada endpoint y revisa con EXPLAIN QUERY PLAN las consultas SELECT
+que ejecuta.
+"""
+
+import csv
+import io
+import atexit
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+# Base de datos temporal: se configura antes de importar database
+TEMP_DIR = tempfile.mkdtemp()
+atexit.register(shutil.rmtree, TEMP_DIR, True)
+os.environ.pop('DATABASE_URL', None)
+os.environ['DATABASE_PATH'] = os.path.join(TEMP_DIR, 'query_plans.db')
+
+from sqlalchemy import event, text
+from fastapi.testclient import TestClient
+from database import engine, SessionLocal
+from models import User, Category, Subcategory, Transaction
+import main
+import search
+
+# Filas de EXPLAIN QUERY PLAN que indican un recorrido completo de la tabla
+FULL_SCAN = re.compile(r'\bSCAN (TABLE )?transactions\b(?! USING)')
+
+# Nombre de los índices (y tablas de búsqueda FTS5) que aparecen en el plan
+INDEX_NAME = re.compile(r'INDEX (ix_\w+)|SCAN (\w+) VIRTUAL TABLE')
+
+BY_DATE = 'ix_transactions_user_date'
+
+USERS = 5
+TRANSACTIONS_PER_USER = 2000
+CATEGORIES_PER_USER = 10
+SUBCATEGORIES_PER_CATEGORY = 3
+BANKS = ['bbva', 'ing', 'openbank', 'kutxabank_account']
+
+# Consultas SELECT de transacciones y número total de sentencias de la petición en curso
+captured = []
+statements = []
+
+
+@event.listens_for(engine, 'before_cursor_execute')
+def capture(conn, cursor, statement, parameters, context, executemany):
+    statements.append(statement)
+    if statement.lstrip().upper().startswith('SELECT') and 'transactions' in statement:
+        captured.append((statement, parameters))
+
+
+def seed(user_id: int):
+    """Transacciones de prueba para el usuario de los tests y otros usuarios"""
+    db = SessionLocal()
+    try:
+        random.seed(22)
+        for other in range(USERS - 1):
+            db.add(User(username=f'otro{other}', hashed_password='x'))
+        db.flush()
+        user_ids = [user.id for user in db.query(User).all()]
+
+        # {usuario: [(categoría, [subcategorías])]}
+        categories = {}
+        for uid in user_ids:
+            categories[uid] = []
+            for c in range(CATEGORIES_PER_USER):
+                category = Category(name=f'Categoría {c}', user_id=uid)
+                db.add(category)
+                db.flush()
+                subcategories = []
+                for sc in range(SUBCATEGORIES_PER_CATEGORY):
+                    subcategory = Subcategory(name=f'Subcategoría {sc}', category_id=category.id, user_id=uid)
+                    db.add(subcategory)
+                    db.flush()
+                    subcategories.append(subcategory.id)
+                categories[uid].append((category.id, subcategories))
+
+        now = datetime.utcnow()
+        rows = []
+        for uid in user_ids:
+            for i in range(TRANSACTIONS_PER_USER):
+                category_id, subcategory_id = None, None
+                if random.random() < 0.7:
+                    category_id, subcategories = random.choice(categories[uid])
+                    subcategory_id = random.choice(subcategories)
+                rows.append({
+                    'user_id': uid,
+                    'bank_type': random.choice(BANKS),
+                    'date': datetime(2023, 1, 1) + timedelta(hours=random.randint(0, 20000)),
+                    'description': f'COMPRA TIENDA {random.randint(1, 300)}',
+                    'amount': round(random.uniform(-200, 200), 2),
+                    'category_id': category_id,
+                    'subcategory_id': subcategory_id,
+                    'transaction_hash': f'{uid}-{i}',
+                    'created_at': now,
+                    'updated_at': now
+                })
+        db.execute(Transaction.__table__.insert(), rows)
+        # Insertadas sin pasar por la importación: indexarlas como al arrancar
+        search.index_missing(db.connection())
+        db.commit()
+        db.execute(text('ANALYZE'))
+        db.commit()
+        return categories[user_id][0][0]
+    finally:
+        db.close()
+
+
+def query_plan(statement: str, parameters) -> list:
+    """Filas de EXPLAIN QUERY PLAN de la consulta"""
+    with engine.connect() as conn:
+        plan = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {statement}', parameters).fetchall()
+    return [row[-1] for row in plan]
+
+
+def check(client: TestClient, headers: dict, name: str, method: str, url: str,
+          indexes: tuple = (), json=None) -> bool:
+    """
+    Llamar al endpoint y comprobar que ninguna de sus consultas recorre la
+    tabla entera y que alguna usa uno de los índices esperados (si se indican)
+    """
+    captured.clear()
+    response = client.request(method, url, headers=headers, json=json)
+    if response.status_code != 200:
+        print(f"❌ {name}: HTTP {response.status_code}")
+        return False
+    if not captured:
+        print(f"❌ {name}: no se ejecutó ninguna consulta de transacciones")
+        return False
+
+    ok = True
+    used = set()
+    for statement, parameters in captured:
+        plan = query_plan(statement, parameters)
+        used.update(name for names in INDEX_NAME.findall(' '.join(plan)) for name in names if name)
+        scans = [row for row in plan if FULL_SCAN.search(row)]
+        if scans:
+            ok = False
+            print(f"❌ {name}: {', '.join(scans)}")
+            print(f"   {' '.join(statement.split())[:200]}")
+    if indexes and not used.intersection(indexes):
+        ok = False
+        print(f"❌ {name}: usa {', '.join(sorted(used)) or 'ningún índice'} en vez de {', '.join(indexes)}")
+    if ok:
+        print(f"✅ {name} ({len(captured)} consultas)")
+    return ok
+
+
+def setup_client():
+    """Usuario de los tests con sus transacciones: (cliente, cabeceras, id de una de sus categorías)"""
+    client = TestClient(main.app)
+    client.post('/api/auth/register', json={'username': 'planes', 'password': 'Planes123'})
+    token = client.post('/api/auth/login', json={'username': 'planes', 'password': 'Planes123'}).json()['access_token']
+    headers = {'Authorization': f'Bearer {token}'}
+    user_id = client.get('/api/auth/me', headers=headers).json()['id']
+
+    category_id = seed(user_id)
+    return client, headers, category_id
+
+
+# Cliente con los datos de prueba, compartido por los tests (se crea una vez)
+_context = None
+
+
+def get_context():
+    global _context
+    if _context is None:
+        _context = setup_client()
+    return _context
+
+
+def check_query_plans(client: TestClient, headers: dict, category_id: int) -> bool:
+    print("=" * 60)
+    print("PROBANDO PLANES DE CONSULTA DE TRANSACCIONES")
+    print("=" * 60)
+
+    first_page = client.get('/api/transactions/?limit=50', headers=headers)
+    cursor = first_page.headers['X-Next-Cursor']
+    transaction_id = first_page.json()[0]['id']
+
+    checks = [
+        ('Listado', 'GET', '/api/transactions/?limit=50', (BY_DATE,)),
+        ('Listado por cursor', 'GET', f'/api/transactions/?limit=50&cursor={cursor}', (BY_DATE,)),
+        ('Listado profundo', 'GET', '/api/transactions/?limit=50&skip=1500', (BY_DATE,)),
+        ('Filtro por banco', 'GET', '/api/transactions/?bank_type=bbva', ('ix_transactions_user_bank_date',)),
+        ('Filtro por categoría', 'GET', f'/api/transactions/?category_id={category_id}',
+         (BY_DATE, 'ix_transactions_user_category')),
+        ('Sin categoría', 'GET', '/api/transactions/?category_id=null',
+         (BY_DATE, 'ix_transactions_user_uncategorized')),
+        ('Gastos', 'GET', '/api/transactions/?transaction_type=expense', (BY_DATE, 'ix_transactions_user_amount')),
+        ('Rango de fechas', 'GET', '/api/transactions/?start_date=2023-03-01&end_date=2023-04-01', (BY_DATE,)),
+        ('Búsqueda por descripción', 'GET', '/api/transactions/?description=tienda 1', ('transactions_search',)),
+        ('Búsqueda corta', 'GET', '/api/transactions/?description=ti', (BY_DATE,)),
+        ('Exportación', 'GET', '/api/transactions/export', (BY_DATE,)),
+        ('Contador', 'GET', '/api/transactions/count', ()),
+        ('Contador por banco', 'GET', '/api/transactions/count?bank_type=bbva', ('ix_transactions_user_bank_date',)),
+        ('Contador sin categoría', 'GET', '/api/transactions/uncategorized/count',
+         ('ix_transactions_user_category', 'ix_transactions_user_uncategorized')),
+        ('Detalle', 'GET', f'/api/transactions/{transaction_id}', ()),
+        ('Informe mensual', 'GET', '/api/reports/monthly?months=12', (BY_DATE,)),
+        ('Informe por categoría', 'GET', '/api/reports/by-category',
+         (BY_DATE, 'ix_transactions_user_amount', 'ix_transactions_user_category')),
+        ('Mayores gastos', 'GET', '/api/reports/top-expenses', (BY_DATE, 'ix_transactions_user_amount')),
+        ('Resumen', 'GET', '/api/reports/summary', (BY_DATE,)),
+        ('Estadísticas', 'GET', '/api/reports/stats', ('ix_transactions_user_amount',)),
+    ]
+
+    ok = True
+    for name, method, url, indexes in checks:
+        ok = check(client, headers, name, method, url, indexes) and ok
+
+    # Categorizar aplicando a todas las transacciones con la misma descripción
+    ok = check(
+        client, headers, 'Aplicar a todas', 'PUT', f'/api/transactions/{transaction_id}',
+        ('ix_transactions_user_description',), json={'category_id': category_id, 'apply_to_all': True}
+    ) and ok
+
+    return ok
+
+
+def check_query_counts(client: TestClient, headers: dict) -> bool:
+    print("\n" + "=" * 60)
+    print("PROBANDO NÚMERO DE CONSULTAS POR PETICIÓN")
+    print("=" * 60)
+
+    transaction_id = client.get('/api/transactions/?limit=1', headers=headers).json()[0]['id']
+
+    # Sentencias como máximo: la del usuario autenticado más las del endpoint,
+    # sin importar cuántas transacciones, categorías o subcategorías devuelva
+    checks = [
+        ('Listado', f'/api/transactions/?limit={TRANSACTIONS_PER_USER}', 2),
+        ('Detalle', f'/api/transactions/{transaction_id}', 2),
+        ('Mayores gastos', '/api/reports/top-expenses?limit=100', 2),
+        ('Resumen', '/api/reports/summary?months=36', 4),
+        ('Exportación', '/api/transactions/export', 2),
+    ]
+
+    ok = True
+    for name, url, max_statements in checks:
+        statements.clear()
+        response = client.get(url, headers=headers)
+        if response.headers['content-type'].startswith('text/csv'):
+            rows = list(csv.DictReader(io.StringIO(response.text)))
+        else:
+            body = response.json()
+            rows = body if isinstance(body, list) else body.get('top_expenses', [body])
+        with_category = sum(1 for row in rows if row.get('category'))
+        if response.status_code != 200 or len(statements) > max_statements:
+            ok = False
+            print(f"❌ {name}: {len(statements)} sentencias (máximo {max_statements}), HTTP {response.status_code}")
+        else:
+            print(f"✅ {name}: {len(statements)} sentencias para {len(rows)} transacciones ({with_category} con categoría)")
+    return ok
+
+
+def test_query_plans():
+    client, headers, category_id = get_context()
+    assert check_query_plans(client, headers, category_id)
+
+
+def test_query_counts():
+    client, headers, _ = get_context()
+    assert check_query_counts(client, headers)
+
+if __name__ == '__main__':
+    client, headers, category_id = get_context()
+    plans_ok = check_query_plans(client, headers, category_id)
+    counts_ok = check_query_counts(client, headers)
+
+    print("\n" + "=" * 60)
+    print("RESUMEN")
+    print("=" * 60)
+    print(f"Planes de consulta: {'✅ OK' if plans_ok else '❌ ERROR'}")
+    print(f"Consultas por petición: {'✅ OK' if counts_ok else '❌ ERROR'}")
+
+    if plans_ok and counts_ok:
+        print("\n🎉 Todos los tests pasaron correctamente!")
+        sys.exit(0)
+    else:
+        print("\n⚠️  Algunos tests fallaron")
+        sys.exit(1)
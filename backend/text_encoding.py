@@ -0,0 +1,75 @@
+"""Detección de la codificación de los extractos de texto (CSV y HTML)"""
+import codecs
+import hashlib
+import os
+from collections import OrderedDict
+
+# Bytes del inicio del archivo que se analizan con chardet si no es UTF-8
+ENCODING_SAMPLE_BYTES = int(os.getenv("ENCODING_SAMPLE_KB", "64")) * 1024
+
+# Número de archivos cuya codificación se recuerda en cada proceso
+ENCODING_CACHE_SIZE = 256
+
+# Codificación de los extractos españoles que no son UTF-8 cuando chardet no decide
+FALLBACK_ENCODING = 'windows-1252'
+
+# Marcas de orden de bytes, en el orden en que deben comprobarse
+_BOMS = [
+    (codecs.BOM_UTF8, 'utf-8-sig'),
+    (codecs.BOM_UTF16_LE, 'utf-16'),
+    (codecs.BOM_UTF16_BE, 'utf-16'),
+]
+
+_cache: 'OrderedDict[bytes, str]' = OrderedDict()
+
+
+def detect_encoding(file_content: bytes) -> str:
+    """
+    Detectar la codificación del archivo.
+
+    Primero se comprueba si hay BOM y si el archivo es UTF-8 válido (lo más
+    habitual y mucho más rápido que chardet); si no, chardet analiza solo el
+    inicio del archivo y su resultado se valida decodificando el archivo
+    entero (si falla, se usa FALLBACK_ENCODING). El resultado se recuerda por
+    el hash del contenido, de modo que la detección del banco y el parser no
+    lo repiten.
+    """
+    key = hashlib.sha256(file_content).digest()
+    encoding = _cache.get(key)
+    if encoding is not None:
+        _cache.move_to_end(key)
+        return encoding
+
+    encoding = _detect(file_content)
+    _cache[key] = encoding
+    if len(_cache) > ENCODING_CACHE_SIZE:
+        _cache.popitem(last=False)
+    return encoding
+
+
+def _detect(file_content: bytes) -> str:
+    for bom, encoding in _BOMS:
+        if file_content.startswith(bom):
+            return encoding
+
+    try:
+        file_content.decode('utf-8')
+        return 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    # chardet solo se importa cuando hace falta (la mayoría de archivos son UTF-8)
+    import chardet
+
+    encoding = chardet.detect(file_content[:ENCODING_SAMPLE_BYTES])['encoding']
+    # El archivo no es UTF-8: si el inicio es ASCII puro, el resto no lo es
+    if not encoding or encoding.lower() == 'ascii':
+        return FALLBACK_ENCODING
+
+    # chardet solo ha visto el inicio: comprobar que el archivo entero se
+    # puede decodificar para no fallar a mitad del parseo
+    try:
+        file_content.decode(encoding)
+    except (UnicodeDecodeError, LookupError):
+        return FALLBACK_ENCODING
+    return encoding
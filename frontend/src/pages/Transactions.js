@@ -1,5 +1,5 @@
 import React, { useState, useEffect, useRef } from 'react';
-import { getTransactions, getCategories, updateTransaction, deleteTransaction, bulkCategorize, bulkDelete, exportTransactions, importTransactions } from '../services/api';
+import { getTransactions, getTransactionsCount, getCategories, updateTransaction, deleteTransaction, bulkCategorize, bulkDelete, exportTransactions, importTransactions } from '../services/api';
 
 function Transactions() {
   const [transactions, setTransactions] = useState([]);
@@ -13,6 +13,10 @@ function Transactions() {
   const [importing, setImporting] = useState(false);
   const [exporting, setExporting] = useState(false);
   const fileInputRef = useRef(null);
+  // Cursor de cada página alcanzada desde la anterior: se pide por cursor en vez de con skip
+  const pageCursors = useRef({});
+  // Filtros del último total calculado: al cambiar de página no se vuelve a contar
+  const countedFilters = useRef(null);
   const itemsPerPage = 100;
   const [filters, setFilters] = useState({
     bank_type: '',
@@ -30,9 +34,21 @@ function Transactions() {
 
   useEffect(() => {
     // Reset to page 1 when filters change
+    pageCursors.current = {};
     setPage(1);
   }, [filters]);
 
+  const pageParams = () => {
+    const cursor = pageCursors.current[page];
+    if (cursor) return { cursor, limit: itemsPerPage };
+    return { skip: (page - 1) * itemsPerPage, limit: itemsPerPage };
+  };
+
+  const rememberNextCursor = (response) => {
+    const nextCursor = response.headers['x-next-cursor'];
+    if (nextCursor) pageCursors.current[page + 1] = nextCursor;
+  };
+
   const loadCategories = async () => {
     try {
       const response = await getCategories();
@@ -42,32 +58,39 @@ function Transactions() {
     }
   };
 
+  const filterParams = () => {
+    const params = {};
+    if (filters.bank_type) params.bank_type = filters.bank_type;
+    if (filters.category_id) {
+      // Si es "null", enviar como parámetro especial para filtrar sin categoría
+      params.category_id = filters.category_id === 'null' ? 'null' : filters.category_id;
+    }
+    if (filters.transaction_type) params.transaction_type = filters.transaction_type;
+    if (filters.description && filters.description.length >= 3) params.description = filters.description;
+    if (filters.start_date) params.start_date = filters.start_date;
+    if (filters.end_date) params.end_date = filters.end_date;
+    return params;
+  };
+
+  const loadTotalCount = async (params, force = false) => {
+    const key = JSON.stringify(params);
+    if (!force && countedFilters.current === key) return;
+    countedFilters.current = key;
+    const countResponse = await getTransactionsCount(params);
+    setTotalCount(countResponse.data.count);
+  };
+
   const loadTransactions = async () => {
     try {
       setLoading(true);
-      const params = {
-        skip: (page - 1) * itemsPerPage,
-        limit: itemsPerPage
-      };
-      if (filters.bank_type) params.bank_type = filters.bank_type;
-      if (filters.category_id) {
-        // Si es "null", enviar como parámetro especial para filtrar sin categoría
-        params.category_id = filters.category_id === 'null' ? 'null' : filters.category_id;
-      }
-      if (filters.transaction_type) params.transaction_type = filters.transaction_type;
-      if (filters.description && filters.description.length >= 3) params.description = filters.description;
-      if (filters.start_date) params.start_date = filters.start_date;
-      if (filters.end_date) params.end_date = filters.end_date;
+      const params = filterParams();
 
-      const response = await getTransactions(params);
+      const response = await getTransactions({ ...params, ...pageParams() });
       setTransactions(response.data);
+      rememberNextCursor(response);
 
-      // Get total count for pagination
-      const countParams = { ...params };
-      delete countParams.skip;
-      delete countParams.limit;
-      const countResponse = await getTransactions({ ...countParams, limit: 1000000 });
-      setTotalCount(countResponse.data.length);
+      // Total para la paginación: solo se vuelve a contar si cambiaron los filtros
+      await loadTotalCount(params);
     } catch (error) {
       console.error('Error cargando transacciones:', error);
     } finally {
@@ -77,29 +100,14 @@ function Transactions() {
 
   const reloadTransactionsWithoutScroll = async () => {
     try {
-      const params = {
-        skip: (page - 1) * itemsPerPage,
-        limit: itemsPerPage
-      };
-      if (filters.bank_type) params.bank_type = filters.bank_type;
-      if (filters.category_id) {
-        // Si es "null", enviar como parámetro especial para filtrar sin categoría
-        params.category_id = filters.category_id === 'null' ? 'null' : filters.category_id;
-      }
-      if (filters.transaction_type) params.transaction_type = filters.transaction_type;
-      if (filters.description && filters.description.length >= 3) params.description = filters.description;
-      if (filters.start_date) params.start_date = filters.start_date;
-      if (filters.end_date) params.end_date = filters.end_date;
+      const params = filterParams();
 
-      const response = await getTransactions(params);
+      const response = await getTransactions({ ...params, ...pageParams() });
       setTransactions(response.data);
+      rememberNextCursor(response);
 
       // Update total count
-      const countParams = { ...params };
-      delete countParams.skip;
-      delete countParams.limit;
-      const countResponse = await getTransactions({ ...countParams, limit: 1000000 });
-      setTotalCount(countResponse.data.length);
+      await loadTotalCount(params, true);
     } catch (error) {
       console.error('Error cargando transacciones:', error);
     }
@@ -322,6 +330,8 @@ function Transactions() {
       }
 
       alert(message);
+      // Las transacciones importadas desplazan las páginas: sus cursores ya no valen
+      pageCursors.current = {};
       reloadTransactionsWithoutScroll();
     } catch (error) {
       console.error('Error importando transacciones:', error);
@@ -1,5 +1,7 @@
 import React, { useState, useEffect } from 'react';
-import { uploadCSV, getBankTypes, detectBank } from '../services/api';
+import { uploadCSV, getBankTypes, detectBank, getImportJob, streamImportJob } from '../services/api';
+
+const JOB_POLL_INTERVAL_MS = 1000;
 
 function Upload() {
   const [bankTypes, setBankTypes] = useState([]);
@@ -10,6 +12,7 @@ function Upload() {
   const [detectedBanks, setDetectedBanks] = useState({});
   const [result, setResult] = useState(null);
   const [useAutoDetect, setUseAutoDetect] = useState(true);
+  const [progress, setProgress] = useState(null);
 
   useEffect(() => {
     loadBankTypes();
@@ -75,7 +78,8 @@ function Upload() {
       // Si está en modo manual, enviar el banco seleccionado
       const bankToUse = useAutoDetect ? null : selectedBank;
       const response = await uploadCSV(files, bankToUse);
-      setResult(response.data);
+      const job = await waitForJob(response.data);
+      setResult(job);
       setFiles([]);
       setDetectedBanks({});
       setSelectedBank('');
@@ -90,7 +94,31 @@ function Upload() {
       });
     } finally {
       setUploading(false);
+      setProgress(null);
+    }
+  };
+
+  // La importación se procesa en segundo plano: seguir su progreso por
+  // Server-Sent Events y, si no es posible, consultar el trabajo periódicamente
+  const waitForJob = async (job) => {
+    setProgress(job);
+    try {
+      const finished = await streamImportJob(job.id, setProgress);
+      if (finished.status === 'completed' || finished.status === 'failed') {
+        return finished;
+      }
+      job = finished;
+    } catch (error) {
+      console.error('Error recibiendo el progreso, consultando periódicamente:', error);
     }
+
+    while (job.status !== 'completed' && job.status !== 'failed') {
+      setProgress(job);
+      await new Promise(resolve => setTimeout(resolve, JOB_POLL_INTERVAL_MS));
+      const response = await getImportJob(job.id);
+      job = response.data;
+    }
+    return job;
   };
 
   return (
@@ -194,7 +222,7 @@ function Upload() {
                               fontSize: '0.9rem'
                             }}>
                               {detection.success
-                                ? `✓ ${detection.bank_name}`
+                                ? `✓ ${detection.bank_name} (${Math.round(detection.confidence * 100)}%)`
                                 : '⚠️ No detectado'}
                             </span>
                           )}
@@ -234,6 +262,24 @@ function Upload() {
         </form>
       </div>
 
+      {/* Progreso de la importación */}
+      {progress && (
+        <div className="card">
+          <p style={{ color: '#e8e8e8', marginBottom: '0.5rem' }}>
+            <strong>Importando... {progress.imported} nuevas, {progress.duplicates} duplicadas</strong>
+          </p>
+          <ul style={{ listStyle: 'none', padding: 0, margin: 0, color: '#a8a8a8' }}>
+            {progress.files.map(file => (
+              <li key={file.id}>
+                {file.message || `📄 ${file.filename}: ${file.status}${
+                  file.total_rows ? ` (${file.total_rows} leídas)` : ''
+                }`}
+              </li>
+            ))}
+          </ul>
+        </div>
+      )}
+
       {/* Resultado */}
       {result && (
         <div className={`alert ${result.success ? 'alert-success' : 'alert-error'}`}>
@@ -55,6 +55,10 @@ export const getTransactions = (params = {}) => {
   return api.get('/api/transactions/', { params });
 };
 
+export const getTransactionsCount = (params = {}) => {
+  return api.get('/api/transactions/count', { params });
+};
+
 export const getTransaction = (id) => {
   return api.get(`/api/transactions/${id}`);
 };
@@ -189,6 +193,61 @@ export const uploadCSV = (files, bankType = null) => {
   });
 };
 
+export const getImportJob = (jobId) => {
+  return api.get(`/api/upload/jobs/${jobId}`);
+};
+
+// Recibir el progreso de un trabajo por Server-Sent Events.
+// Se usa fetch en lugar de EventSource para poder enviar la cabecera Authorization.
+// Devuelve el trabajo terminado.
+export const streamImportJob = async (jobId, onProgress) => {
+  const token = localStorage.getItem('token');
+  const response = await fetch(`${API_URL}/api/upload/jobs/${jobId}/events`, {
+    headers: token ? { Authorization: `Bearer ${token}` } : {},
+  });
+
+  if (!response.ok || !response.body) {
+    throw new Error(`Error al recibir el progreso (${response.status})`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+  let lastJob = null;
+
+  while (true) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Los eventos se separan por una línea en blanco
+    let separator;
+    while ((separator = buffer.indexOf('\n\n')) !== -1) {
+      const rawEvent = buffer.slice(0, separator);
+      buffer = buffer.slice(separator + 2);
+
+      const data = rawEvent
+        .split('\n')
+        .filter(line => line.startsWith('data:'))
+        .map(line => line.slice(5).trim())
+        .join('\n');
+      if (!data) continue;
+
+      lastJob = JSON.parse(data);
+      if (rawEvent.includes('event: done')) {
+        reader.cancel();
+        return lastJob;
+      }
+      onProgress(lastJob);
+    }
+  }
+
+  if (!lastJob) {
+    throw new Error('La conexión de progreso se cerró sin datos');
+  }
+  return lastJob;
+};
+
 export const getBankTypes = () => {
   return api.get('/api/upload/bank-types');
 };